@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GreenhouseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'greenhouse'
+
+    def ready(self):
+        from greenhouse import signals  # noqa: F401 - connects the post_save receivers
@@ -1,32 +1,85 @@
-import csv
-import random
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-from django.core.management.base import BaseCommand
+import django
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
 from greenhouse.services.data_generator import GreenhouseDataGenerator
-from greenhouse.services.decision import GreenhouseDecisionModel
-from greenhouse.models import EquipmentState
+from greenhouse.services.decision import COMMAND_BITS, GreenhouseDecisionModel
+from greenhouse.models import EquipmentStateBits, pack_equipment
+
+READING_FIELDS = [
+    "temperature", "humidity", "soil_moisture", "light_intensity", "co2_concentration"
+]
 
 EQUIPMENT_FIELDS = [
     "heater", "ventilation", "irrigation",
     "co2_injector", "lights", "dehumidifier", "light_blinds"
 ]
 
+# Rows between progress updates / flushes of the --show output
+PROGRESS_EVERY = 1000
 
-def apply_command_to_equipment_state(command):
-    """Closed-loop: apply chosen command to EquipmentState so generator responds next tick."""
-    for eq in EQUIPMENT_FIELDS:
-        EquipmentState.objects.update_or_create(
-            equipment_type=eq,
-            defaults={"is_active": bool(getattr(command, eq, False))}
-        )
+# One format per CSV column: sensors with 2 decimals, equipment as 0/1
+CSV_FORMAT = ["%.2f"] * len(READING_FIELDS) + ["%d"] * len(EQUIPMENT_FIELDS)
+
+
+def save_equipment_state(values):
+    """Write equipment booleans (EQUIPMENT_FIELDS order) to the EquipmentStateBits row."""
+    EquipmentStateBits.store(pack_equipment(dict(zip(EQUIPMENT_FIELDS, values))))
+
+
+def generate_samples(config_name, samples, seed, on_row=None):
+    """
+    Run the closed loop (generator -> decision model -> equipment) in memory.
+
+    Runs samples+1 ticks and drops the first. Returns (sensors, cmds) arrays
+    of shape (samples, 5) and (samples, 7); nothing is written to the DB.
+    on_row(i, sensors_row, cmds_row) is called after each kept row.
+    """
+    generator = GreenhouseDataGenerator(config_name=config_name, persist=False, seed=seed, verbose=False)
+    generator.initialize(clear_data=False)
+    decision_model = GreenhouseDecisionModel()
+
+    # Preallocated output buffers: sensor readings + equipment bits
+    sensors = np.empty((samples, len(READING_FIELDS)), dtype=np.float64)
+    cmds = np.empty((samples, len(EQUIPMENT_FIELDS)), dtype=np.uint8)
+
+    # Closed-loop equipment state lives in memory during the run, packed as bits
+    # (bit i = EQUIPMENT_FIELDS[i]); first tick starts from the configured equipment
+    state = pack_equipment(generator.equipment_state)
 
+    for step in range(samples + 1):
+        values = generator.generate_values()
+        # The previous command was applied as-is, so it is the current equipment state
+        state = decision_model.decide_bits(values, state)
 
-def command_dict(command):
-    """Only equipment booleans, no Django internals."""
-    return {k: bool(getattr(command, k, False)) for k in EQUIPMENT_FIELDS}
+        # Apply command so next tick reflects equipment effects
+        equipment = COMMAND_BITS[state]
+        generator.set_equipment_vector(equipment)
+
+        # Drop first row
+        if step == 0:
+            continue
+
+        # NOTE: no tick, no weather (as you requested)
+        i = step - 1
+        sensors[i] = values
+        cmds[i] = equipment
+
+        if on_row is not None:
+            on_row(i, sensors[i], cmds[i])
+
+    return sensors, cmds
+
+
+def _generate_chunk(spec):
+    """ProcessPoolExecutor worker: spec = (config_name, samples, seed_sequence)"""
+    return generate_samples(*spec)
 
 
 class Command(BaseCommand):
@@ -74,6 +127,14 @@ class Command(BaseCommand):
             action="store_true",
             help="Print per-tick readings + commands",
         )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Worker processes. With N>1 the samples are split into N independent runs "
+                 "(one seed stream each) that are concatenated into the same CSV; "
+                 "not combinable with --show/--interval, and the equipment state is not saved.",
+        )
 
     def handle(self, *args, **options):
         config_name = options["config"]
@@ -83,76 +144,94 @@ class Command(BaseCommand):
         output = options["output"]
         interval = options["interval"]
         show = options["show"]
+        jobs = options["jobs"]
 
-        random.seed(seed)
+        total_steps = samples + 1  # run one extra, drop first
 
-        generator = GreenhouseDataGenerator(config_name=config_name)
-        generator.initialize(clear_data=False)
-        decision_model = GreenhouseDecisionModel()
+        if jobs > 1 and (show or interval > 0):
+            raise CommandError("--show and --interval only work with --jobs 1 (workers run unpaced and silent)")
+
+        if jobs > 1:
+            self.stdout.write(self.style.SUCCESS(
+                f"Generating {samples} rows for config='{config_name}' with {jobs} worker processes ..."
+            ))
+            # No equipment state is saved: the last row of concatenated independent runs
+            # isn't the end state of any one closed loop
+            sensors, cmds = self._generate_parallel(config_name, samples, seed, jobs)
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Generating {samples} rows for config='{config_name}' (running {total_steps} ticks, dropping first) ..."
+            ))
+            sensors, cmds = self._generate_serial(config_name, samples, seed, interval, show)
+
+            # Persist the final equipment state once
+            if len(cmds):
+                save_equipment_state(cmds[-1])
 
-        rows = []
-        total_steps = samples + 1  # run one extra, drop first
+        outdir.mkdir(parents=True, exist_ok=True)
+
+        if output is None:
+            ts = time.strftime("%Y%m%d-%H%M%S")
+            output = f"{config_name}_samples{samples}_seed{seed}_{ts}.csv"
+
+        outpath = outdir / output
 
-        self.stdout.write(self.style.SUCCESS(
-            f"Generating {samples} rows for config='{config_name}' (running {total_steps} ticks, dropping first) ..."
-        ))
-
-        for step in range(total_steps):
-            reading = generator.generate_reading()
-            command = decision_model.decide(reading)
-
-            # Apply command so next tick reflects equipment effects
-            apply_command_to_equipment_state(command)
-
-            # Drop first row
-            if step == 0:
-                if interval > 0:
-                    time.sleep(interval)
-                continue
-            if step%50 == 0:
-                print(step)
-            cmd = command_dict(command)
-
-            # NOTE: no tick, no weather (as you requested)
-            row = {
-                "temperature": round(reading.temperature, 2),
-                "humidity": round(reading.humidity, 2),
-                "soil_moisture": round(reading.soil_moisture, 2),
-                "light_intensity": round(reading.light_intensity, 2),
-                "co2_concentration": round(reading.co2_concentration, 2),
-                **cmd,
-            }
-            rows.append(row)
+        # Write CSV in one batch (equipment columns are written as 0/1)
+        out = np.concatenate([sensors, cmds.astype(np.float64)], axis=1)
+        with outpath.open("w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+            f.write(",".join(READING_FIELDS + EQUIPMENT_FIELDS) + "\n")
+            np.savetxt(f, out, fmt=CSV_FORMAT, delimiter=",")
+
+        self.stdout.write(self.style.SUCCESS(f"Saved {len(out)} rows to: {outpath}"))
+
+    def _generate_serial(self, config_name, samples, seed, interval, show):
+        # --show lines are written in batches (one line at a time when pacing with --interval)
+        show_lines = []
+        show_every = 1 if interval > 0 else PROGRESS_EVERY
+
+        def on_row(i, sensor_row, cmd_row):
+            step = i + 1
+            if step % PROGRESS_EVERY == 0:
+                sys.stderr.write(f"{step}\n")
 
             if show:
-                on_cmds = [k for k, v in cmd.items() if v]
-                self.stdout.write(
-                    f"[{config_name}] {step-1:5d} "
-                    f"T={row['temperature']:>5.2f} H={row['humidity']:>5.2f} "
-                    f"S={row['soil_moisture']:>5.2f} L={row['light_intensity']:>7.0f} "
-                    f"CO2={row['co2_concentration']:>6.0f} "
-                    f"cmds={','.join(on_cmds) if on_cmds else 'None'}"
+                on_cmds = [k for k, v in zip(EQUIPMENT_FIELDS, cmd_row) if v]
+                t, h, s, l, co2 = sensor_row
+                show_lines.append(
+                    f"[{config_name}] {i:5d} "
+                    f"T={t:>5.2f} H={h:>5.2f} "
+                    f"S={s:>5.2f} L={l:>7.0f} "
+                    f"CO2={co2:>6.0f} "
+                    f"cmds={','.join(on_cmds) if on_cmds else 'None'}\n"
                 )
+                if len(show_lines) >= show_every:
+                    self.stdout.write("".join(show_lines), ending="")
+                    show_lines.clear()
 
             if interval > 0:
                 time.sleep(interval)
 
-        outdir.mkdir(parents=True, exist_ok=True)
+        sensors, cmds = generate_samples(config_name, samples, seed, on_row=on_row)
 
-        if output is None:
-            ts = time.strftime("%Y%m%d-%H%M%S")
-            output = f"{config_name}_samples{samples}_seed{seed}_{ts}.csv"
+        if show_lines:
+            self.stdout.write("".join(show_lines), ending="")
 
-        outpath = outdir / output
+        return sensors, cmds
+
+    def _generate_parallel(self, config_name, samples, seed, jobs):
+        # Independent seed stream + share of the samples for every worker
+        seeds = np.random.SeedSequence(seed).spawn(jobs)
+        sizes = [samples // jobs + (1 if k < samples % jobs else 0) for k in range(jobs)]
+        specs = [(config_name, n, ss) for n, ss in zip(sizes, seeds) if n > 0]
 
-        # Write CSV
-        fieldnames = list(rows[0].keys()) if rows else []
-        with outpath.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+        # Workers open their own connection and write nothing; don't hand them the parent's
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=jobs, initializer=django.setup) as pool:
+            results = list(pool.map(_generate_chunk, specs))
 
-        self.stdout.write(self.style.SUCCESS(f"Saved {len(rows)} rows to: {outpath}"))
+        sensors = np.concatenate([r[0] for r in results])
+        cmds = np.concatenate([r[1] for r in results])
+        return sensors, cmds
 
 
 # optimal: 2000
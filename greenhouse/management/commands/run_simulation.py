@@ -1,9 +1,9 @@
+import asyncio
+
 from django.core.management.base import BaseCommand
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.interval import IntervalTrigger
 from django.utils import timezone
 from greenhouse.services.data_generator import GreenhouseDataGenerator
-from greenhouse.models import EquipmentState
+from greenhouse.models import EquipmentStateBits, unpack_equipment
 import sys
 
 
@@ -29,11 +29,39 @@ class Command(BaseCommand):
             default=5,
             help='Data generation interval in seconds (default: 5)'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1,
+            help='Insert readings in batches of this size (default: 1 = every tick)'
+        )
+        parser.add_argument(
+            '--backfill',
+            type=int,
+            default=0,
+            help='Generate this many readings at once (no delay) before the live loop'
+        )
+        parser.add_argument(
+            '--eps',
+            type=float,
+            default=0.0,
+            help='Only store a reading when a metric moved by this fraction of its range (default: 0 = store all)'
+        )
+        parser.add_argument(
+            '--max-gap',
+            type=int,
+            default=None,
+            help='With --eps, store a reading at least every this many ticks'
+        )
 
     def handle(self, *args, **options):
         config = options['config']
         continue_simulation = options['continue']
         interval = options['interval']
+        batch_size = options['batch_size']
+        backfill = options['backfill']
+        eps = options['eps']
+        max_gap = options['max_gap']
 
         self.stdout.write(self.style.SUCCESS('=' * 60))
         self.stdout.write(self.style.SUCCESS('  GREENHOUSE SIMULATION STARTING'))
@@ -50,7 +78,9 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('=' * 60))
 
         # Initialize data generator
-        generator = GreenhouseDataGenerator(config_name=config)
+        generator = GreenhouseDataGenerator(
+            config_name=config, verbose=True, batch_size=batch_size, eps=eps, max_gap=max_gap
+        )
 
         # Initialize (clear data unless continuing)
         first_reading = generator.initialize(clear_data=not continue_simulation)
@@ -68,54 +98,65 @@ class Command(BaseCommand):
         # Show equipment status
         self.stdout.write('')
         self.stdout.write(self.style.SUCCESS('✓ Equipment Status:'))
-        equipment_states = EquipmentState.objects.all().order_by('equipment_type')
-        for equipment in equipment_states:
-            status = self.style.SUCCESS('ON ') if equipment.is_active else self.style.ERROR('OFF')
-            self.stdout.write(f'  {equipment.get_equipment_type_display():15s}: {status}')
+        labels = dict(EquipmentStateBits.EQUIPMENT_CHOICES)
+        equipment_states = unpack_equipment(EquipmentStateBits.current_bits())
+        for equipment_type in sorted(equipment_states):
+            status = self.style.SUCCESS('ON ') if equipment_states[equipment_type] else self.style.ERROR('OFF')
+            self.stdout.write(f'  {labels[equipment_type]:15s}: {status}')
+
+        if backfill > 0:
+            readings = generator.generate_many(backfill)
+            self.stdout.write('')
+            self.stdout.write(self.style.SUCCESS(f'✓ Backfilled {len(readings)} readings (up to tick {generator.tick})'))
 
         self.stdout.write('')
         self.stdout.write(self.style.SUCCESS('Simulation running... Press Ctrl+C to stop'))
         self.stdout.write('-' * 60)
 
-        # Create scheduler
-        scheduler = BlockingScheduler()
-
-        # Schedule data generation
-        scheduler.add_job(
-            func=self.generate_data,
-            trigger=IntervalTrigger(seconds=interval),
-            args=[generator],
-            id='data_generation',
-            name='Generate sensor readings',
-            replace_existing=True
-        )
-
         try:
-            scheduler.start()
+            asyncio.run(self._run(generator, interval))
         except KeyboardInterrupt:
             self.stdout.write('')
             self.stdout.write('-' * 60)
             self.stdout.write(self.style.WARNING('Stopping simulation...'))
-            scheduler.shutdown()
+
+            # Insert readings still waiting for a full batch
+            generator.flush()
 
             # Show final stats
             from greenhouse.models import GreenhouseReading
             total_readings = GreenhouseReading.objects.count()
-            last_reading = GreenhouseReading.objects.first()
+            last_tick = GreenhouseReading.objects.values_list('tick', flat=True).first()
 
             self.stdout.write('')
             self.stdout.write(self.style.SUCCESS('Simulation stopped'))
             self.stdout.write(f'Total readings generated: {total_readings}')
-            if last_reading:
-                self.stdout.write(f'Last tick: {last_reading.tick}')
-                self.stdout.write(f'Duration: ~{last_reading.tick * interval} seconds')
+            if last_tick is not None:
+                self.stdout.write(f'Last tick: {last_tick}')
+                self.stdout.write(f'Duration: ~{last_tick * interval} seconds')
             self.stdout.write('')
 
+    async def _run(self, generator, interval):
+        """Generate a reading every `interval` seconds (fixed rate, no drift)"""
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + interval
+        while True:
+            await asyncio.sleep(max(0.0, next_run - loop.time()))
+            # DB write + print happen in a worker thread so the loop stays responsive
+            await asyncio.to_thread(self.generate_data, generator)
+            next_run += interval
+
     def generate_data(self, generator):
         """Generate and store sensor reading"""
         try:
+            # Nothing in this process changes equipment; pick up external changes from the DB
+            generator.refresh_equipment()
             reading = generator.generate_reading()
 
+            # Nobody is watching (output redirected) -> skip the formatting
+            if not self.stdout.isatty():
+                return
+
             # Format output
             timestamp = timezone.now().strftime("%H:%M:%S")
 
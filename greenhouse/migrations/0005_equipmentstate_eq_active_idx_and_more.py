@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-15 21:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greenhouse', '0004_greenhousecommand_light_blinds_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipmentstate',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['equipment_type'], name='eq_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='greenhousecommand',
+            index=models.Index(fields=['timestamp'], name='command_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='greenhousereading',
+            index=models.Index(fields=['timestamp'], name='reading_timestamp_idx'),
+        ),
+    ]
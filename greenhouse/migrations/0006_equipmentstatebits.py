@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-15 22:13
+
+from django.db import migrations, models
+
+# Bit order of EquipmentStateBits.bits at the time of this migration
+EQUIPMENT = ("heater", "ventilation", "irrigation", "co2_injector", "lights", "dehumidifier", "light_blinds")
+
+
+def rows_to_bits(apps, schema_editor):
+    EquipmentState = apps.get_model('greenhouse', 'EquipmentState')
+    EquipmentStateBits = apps.get_model('greenhouse', 'EquipmentStateBits')
+    active = set(EquipmentState.objects.filter(is_active=True).values_list('equipment_type', flat=True))
+    bits = sum(1 << i for i, eq in enumerate(EQUIPMENT) if eq in active)
+    EquipmentStateBits.objects.update_or_create(pk=1, defaults={'bits': bits})
+
+
+def bits_to_rows(apps, schema_editor):
+    EquipmentState = apps.get_model('greenhouse', 'EquipmentState')
+    EquipmentStateBits = apps.get_model('greenhouse', 'EquipmentStateBits')
+    bits = EquipmentStateBits.objects.filter(pk=1).values_list('bits', flat=True).first() or 0
+    EquipmentState.objects.bulk_create(
+        [EquipmentState(equipment_type=eq, is_active=bool(bits >> i & 1)) for i, eq in enumerate(EQUIPMENT)]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('greenhouse', '0005_equipmentstate_eq_active_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentStateBits',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bits', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Equipment State',
+                'verbose_name_plural': 'Equipment State',
+            },
+        ),
+        migrations.RunPython(rows_to_bits, bits_to_rows),
+        migrations.DeleteModel(
+            name='EquipmentState',
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 
 class GreenhouseReading(models.Model):
@@ -20,6 +20,10 @@ class GreenhouseReading(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Greenhouse Reading'
         verbose_name_plural = 'Greenhouse Readings'
+        indexes = [
+            # Default ordering / "latest reading" lookups
+            models.Index(fields=['timestamp'], name='reading_timestamp_idx'),
+        ]
 
     def __str__(self):
         return (
@@ -47,6 +51,9 @@ class GreenhouseCommand(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Greenhouse Command'
         verbose_name_plural = 'Greenhouse Commands'
+        indexes = [
+            models.Index(fields=['timestamp'], name='command_timestamp_idx'),
+        ]
 
     def __str__(self):
         active = []
@@ -56,8 +63,27 @@ class GreenhouseCommand(models.Model):
         return f"Tick {self.tick} | Active: {', '.join(active) if active else 'None'}"
 
 
-class EquipmentState(models.Model):
-    """Tracks current state of each equipment (updated in place)"""
+# Equipment order inside EquipmentStateBits.bits (bit i = EQUIPMENT[i]); same order as
+# the GreenhouseCommand fields
+EQUIPMENT = ("heater", "ventilation", "irrigation", "co2_injector", "lights", "dehumidifier", "light_blinds")
+
+
+def pack_equipment(states: dict) -> int:
+    """{equipment_type: is_active} -> bits (missing equipment is off)"""
+    bits = 0
+    for i, equipment_type in enumerate(EQUIPMENT):
+        if states.get(equipment_type, False):
+            bits |= 1 << i
+    return bits
+
+
+def unpack_equipment(bits: int) -> dict:
+    """bits -> {equipment_type: is_active} in EQUIPMENT order"""
+    return {equipment_type: bool(bits >> i & 1) for i, equipment_type in enumerate(EQUIPMENT)}
+
+
+class EquipmentStateBits(models.Model):
+    """Current state of all equipment in a single row (updated in place), one bit per equipment"""
     EQUIPMENT_CHOICES = [
         ('heater', 'Heater'),
         ('ventilation', 'Ventilation'),
@@ -68,14 +94,39 @@ class EquipmentState(models.Model):
         ('light_blinds', 'Light Blinds'),
     ]
 
-    equipment_type = models.CharField(max_length=20, choices=EQUIPMENT_CHOICES, unique=True)
-    is_active = models.BooleanField(default=False)
-    last_updated = models.DateTimeField(auto_now=True)
+    # Primary key of the one row
+    SINGLETON_ID = 1
+
+    bits = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Equipment State'
-        verbose_name_plural = 'Equipment States'
+        verbose_name_plural = 'Equipment State'
 
     def __str__(self):
-        status = "ON" if self.is_active else "OFF"
-        return f"{self.get_equipment_type_display()}: {status}"
\ No newline at end of file
+        labels = dict(self.EQUIPMENT_CHOICES)
+        active = [labels[name] for name, on in unpack_equipment(self.bits).items() if on]
+        return f"Active: {', '.join(active) if active else 'None'}"
+
+    @classmethod
+    def current_bits(cls) -> int:
+        """Stored bits (0 = everything off when the row doesn't exist yet)"""
+        bits = cls.objects.filter(pk=cls.SINGLETON_ID).values_list('bits', flat=True).first()
+        return bits or 0
+
+    @classmethod
+    def store(cls, bits: int):
+        """Overwrite the stored bits (a save(), so post_save receivers see it)"""
+        row, _ = cls.objects.update_or_create(pk=cls.SINGLETON_ID, defaults={'bits': bits})
+        return row
+
+    @classmethod
+    def set_equipment(cls, equipment_type: str, is_active: bool):
+        """Switch one equipment on/off, leaving the other bits as stored"""
+        bit = 1 << EQUIPMENT.index(equipment_type)
+        with transaction.atomic():
+            row, _ = cls.objects.select_for_update().get_or_create(pk=cls.SINGLETON_ID)
+            row.bits = row.bits | bit if is_active else row.bits & ~bit
+            row.save()
+        return row
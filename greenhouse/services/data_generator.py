@@ -1,76 +1,134 @@
-import random
-from greenhouse.models import GreenhouseReading, EquipmentState
+from collections import namedtuple
+from enum import IntEnum
+
+import numpy as np
+
+from django.db import connection, transaction
+
+from greenhouse.models import EQUIPMENT, GreenhouseReading, EquipmentStateBits, unpack_equipment
+from greenhouse.signals import live_generators
+from greenhouse.services.kernels import sim_step
+
+# Order of the sensor metrics inside the state / target vectors
+METRICS = ("temperature", "humidity", "soil_moisture", "light_intensity", "co2_concentration")
+
+# Bit of each equipment inside the equipment bitmask (EQUIPMENT order, as EquipmentStateBits.bits)
+EQUIPMENT_BITS = {eq: 1 << i for i, eq in enumerate(EQUIPMENT)}
+
+
+
+class Weather(IntEnum):
+    """Weather kinds; the value is the row in weather-indexed arrays"""
+    Sunny = 0
+    Clear_sky = 1
+    Cloudy = 2
+    Rainy = 3
+    Windy = 4
+
+
+# One value per metric (fields in METRICS order, missing metrics are 0)
+TargetVec = namedtuple('TargetVec', METRICS, defaults=(0.0,) * len(METRICS))
+
+
+def _metric_vector(values):
+    """Per-metric dict -> array in METRICS order (missing metrics are 0)"""
+    return np.array([values.get(m, 0.0) for m in METRICS], dtype=np.float64)
+
+
+def _metric_matrix(table, keys):
+    """{key: TargetVec} -> dense float32 (len(keys), len(METRICS)) array, one row per key"""
+    return np.array([table.get(k, TargetVec()) for k in keys], dtype=np.float32)
+
+
+def _state_property(index):
+    """Expose one slot of the state vector as a scalar attribute"""
+    def getter(self):
+        return float(self.state[index])
+
+    def setter(self, value):
+        self.state[index] = value
+
+    return property(getter, setter)
+
 
 class GreenhouseDataGenerator:
     """Generates realistic greenhouse sensor readings with equilibrium targets"""
+
+    # Fixed per-instance attributes (no __dict__); __weakref__ for greenhouse.signals.live_generators
+    __slots__ = (
+        'config_name', 'persist', 'verbose', 'batch_size', 'rng', 'tick', 'state',
+        'last_targets', '_weather', '_targets', '_equipment_active', '_equipment_mask',
+        '_noise_buf', '_noise_idx', '_pending', 'eps', 'max_gap',
+        '_last_persisted_state', '_last_persisted_tick', '_ticks_until_weather_change', '__weakref__',
+    )
     
     # Weather target states (what conditions naturally settle at)
     WEATHER_TARGETS = {
-        'Sunny': {
-            'temperature': 28.0,      # Hot in sun
-            'humidity': 45.0,         # Dry in sun
-            'light_intensity': 35000, # Bright sunlight
-            'soil_moisture': 50.0,    # Evaporates
-            'co2_concentration': 400.0
-        },
-        'Clear_sky': {
-            'temperature': 23.0,      # Mild
-            'humidity': 60.0,         # Moderate
-            'light_intensity': 15000, # Good light
-            'soil_moisture': 55.0,
-            'co2_concentration': 400.0
-        },
-        'Cloudy': {
-            'temperature': 19.0,      # Cool
-            'humidity': 75.0,         # Humid
-            'light_intensity': 5000,  # Dim
-            'soil_moisture': 58.0,
-            'co2_concentration': 400.0
-        },
-        'Rainy': {
-            'temperature': 16.0,      # Cold
-            'humidity': 90.0,         # Very humid
-            'light_intensity': 2000,  # Dark
-            'soil_moisture': 75.0,    # Wet
-            'co2_concentration': 400.0
-        },
-        'Windy': {
-            'temperature': 20.0,      # Cool from wind
-            'humidity': 50.0,         # Dry from wind
-            'light_intensity': 12000, # Variable
-            'soil_moisture': 48.0,    # Dries fast
-            'co2_concentration': 380.0 # Ventilated
-        }
+        'Sunny': TargetVec(
+            temperature=28.0,      # Hot in sun
+            humidity=45.0,         # Dry in sun
+            light_intensity=35000, # Bright sunlight
+            soil_moisture=50.0,    # Evaporates
+            co2_concentration=400.0
+        ),
+        'Clear_sky': TargetVec(
+            temperature=23.0,      # Mild
+            humidity=60.0,         # Moderate
+            light_intensity=15000, # Good light
+            soil_moisture=55.0,
+            co2_concentration=400.0
+        ),
+        'Cloudy': TargetVec(
+            temperature=19.0,      # Cool
+            humidity=75.0,         # Humid
+            light_intensity=5000,  # Dim
+            soil_moisture=58.0,
+            co2_concentration=400.0
+        ),
+        'Rainy': TargetVec(
+            temperature=16.0,      # Cold
+            humidity=90.0,         # Very humid
+            light_intensity=2000,  # Dark
+            soil_moisture=75.0,    # Wet
+            co2_concentration=400.0
+        ),
+        'Windy': TargetVec(
+            temperature=20.0,      # Cool from wind
+            humidity=50.0,         # Dry from wind
+            light_intensity=12000, # Variable
+            soil_moisture=48.0,    # Dries fast
+            co2_concentration=380.0 # Ventilated
+        )
     }
     
     # Equipment target modifications (added to weather targets when active)
     EQUIPMENT_TARGETS = {
-        'heater': {
-            'temperature': +8.0,      # Adds 8°C to target
-        },
-        'ventilation': {
-            'temperature': -8.0,      # Reduces target by 8°C
-            'humidity': -15.0,        # Reduces humidity target
-            'co2_concentration': -50.0
-        },
-        'irrigation': {
-            'soil_moisture': +25.0,   # Target much higher moisture
-            'humidity': +5.0,
-        },
-        'co2_injector': {
-            'co2_concentration': +300.0  # Target 300ppm
-        },
-        'lights': {
-            'light_intensity': +15000,   # Add artificial light target
-            'temperature': +2.0,
-        },
-        'dehumidifier': {
-            'humidity': -20.0,        # Target lower humidity
-            'temperature': +1.5,      # Dehumidifiers warm slightly
-        },
-        'light_blinds': {
-            'light_intensity': -10000,   # Reduce light significantly
-        }
+        'heater': TargetVec(
+            temperature=+8.0,      # Adds 8°C to target
+        ),
+        'ventilation': TargetVec(
+            temperature=-8.0,      # Reduces target by 8°C
+            humidity=-15.0,        # Reduces humidity target
+            co2_concentration=-50.0
+        ),
+        'irrigation': TargetVec(
+            soil_moisture=+25.0,   # Target much higher moisture
+            humidity=+5.0,
+        ),
+        'co2_injector': TargetVec(
+            co2_concentration=+300.0  # Target 300ppm
+        ),
+        'lights': TargetVec(
+            light_intensity=+15000,   # Add artificial light target
+            temperature=+2.0,
+        ),
+        'dehumidifier': TargetVec(
+            humidity=-20.0,        # Target lower humidity
+            temperature=+1.5,      # Dehumidifiers warm slightly
+        ),
+        'light_blinds': TargetVec(
+            light_intensity=-10000,   # Reduce light significantly
+        )
     }
     
     # Convergence rates (how fast values move toward targets)
@@ -82,18 +140,52 @@ class GreenhouseDataGenerator:
         'light_intensity': 0.15,   # Light changes quickly
         'co2_concentration': 0.12, # CO2 changes moderately
     }
+
+    # Same tables as dense float32 arrays in METRICS order (used on the per-tick path;
+    # every entry is exact in float32, the state itself stays float64)
+    # One row of targets per weather (Weather order x METRICS order)
+    WEATHER_TARGETS_MATRIX = _metric_matrix(WEATHER_TARGETS, [w.name for w in Weather])
+    # One row of target modifiers per equipment (EQUIPMENT order x METRICS order)
+    EQUIPMENT_DELTA = _metric_matrix(EQUIPMENT_TARGETS, EQUIPMENT)
+    # Summed modifiers for every equipment bitmask (row = mask, 128 x METRICS)
+    EQUIPMENT_SUM_TABLE = (
+        ((np.arange(1 << len(EQUIPMENT))[:, None] >> np.arange(len(EQUIPMENT))) & 1).astype(np.float32)
+        @ EQUIPMENT_DELTA
+    )
+    CONVERGENCE = _metric_vector(CONVERGENCE_RATES)
+
+    # Relative sensor noise per metric (fraction of the value, METRICS order)
+    NOISE = np.array([0.005, 0.01, 0.015, 0.02, 0.01])
+
+    # Uniform(-1, 1) noise rows drawn per refill of the noise buffer
+    NOISE_BATCH = 4096
+
+    # Realistic bounds per metric (METRICS order)
+    LOW = np.array([0.0, 0.0, 0.0, 0.0, 300.0])
+    HIGH = np.array([50.0, 100.0, 100.0, 100000.0, 2000.0])
+    # Range per metric, used to compare changes across metrics (eps)
+    SCALE = HIGH - LOW
     
+    # Weather changes on every tick that is a multiple of this
+    WEATHER_CHANGE_EVERY = 40
+
+    # Weather names by Weather value, and the reverse lookup
+    WEATHERS = tuple(w.name for w in Weather)
+    WEATHER_INDEX = {w.name: w for w in Weather}
+
     # Weather transitions
-    WEATHER_TRANSITIONS = {
+    WEATHER_TRANSITIONS = {k: tuple(v) for k, v in {
         'Sunny': ['Cloudy', 'Clear_sky', 'Windy'],
         'Clear_sky': ['Cloudy', 'Sunny', 'Windy'],
         'Cloudy': ['Sunny', 'Clear_sky', 'Rainy', 'Windy'],
         'Rainy': ['Cloudy','Windy'],
         'Windy': ['Cloudy', 'Clear_sky','Rainy']
-    }
+    }.items()}
+    # Same transitions on Weather values (used when ticking)
+    WEATHER_NEXT = {Weather[k]: tuple(Weather[w] for w in v) for k, v in WEATHER_TRANSITIONS.items()}
     
-    # Starting configurations
-    STARTING_CONFIGS = {
+    # Starting configurations (plain values; 'random' is built by _random_config())
+    STARTING_CONFIGS_STATIC = {
         'optimal': {
             'temperature': 22.0,
             'humidity': 65.0,
@@ -145,24 +237,7 @@ class GreenhouseDataGenerator:
                 'light_blinds': False,
             }
         },
-        'random': {
-            'temperature': lambda: random.uniform(18.0, 28.0),
-            'humidity': lambda: random.uniform(50.0, 80.0),
-            'soil_moisture': lambda: random.uniform(40.0, 70.0),
-            'light_intensity': lambda: random.uniform(2000.0, 8000.0),
-            'co2_concentration': lambda: random.uniform(350.0, 500.0),
-            'weather': lambda: random.choice(['Sunny', 'Clear_sky', 'Cloudy', 'Rainy', 'Windy']),
-            'equipment': {
-                'heater': lambda: random.choice([True, False]),
-                'ventilation': lambda: random.choice([True, False]),
-                'irrigation': lambda: random.choice([True, False]),
-                'co2_injector': lambda: random.choice([True, False]),
-                'lights': lambda: random.choice([True, False]),
-                'dehumidifier': lambda: random.choice([True, False]),
-                'light_blinds': lambda: random.choice([True, False]),
-            }
-        },
-            'night_cold': {
+        'night_cold': {
             'temperature': 14.0,
             'humidity': 70.0,
             'soil_moisture': 55.0,
@@ -242,40 +317,101 @@ class GreenhouseDataGenerator:
 
     }
     
-    def __init__(self, config_name='optimal'):
-        """Initialize with a starting configuration"""
+    def __init__(
+        self, config_name='optimal', persist=True, seed=None, verbose=False, batch_size=1, eps=0.0, max_gap=None
+    ):
+        """Initialize with a starting configuration
+
+        persist=False keeps everything in memory (no reading inserts, no
+        EquipmentStateBits writes), which is what the training-data generator wants.
+        verbose=True prints initialization info and weather changes.
+        batch_size: readings are inserted with one bulk_create per batch_size
+        readings (1 = insert every tick); call flush() when done.
+        eps / max_gap: a reading is only stored when some metric moved by at
+        least eps (fraction of its range) since the last stored reading, or
+        max_gap ticks have passed (None = no limit). eps=0 stores every tick.
+        """
         self.config_name = config_name
+        self.persist = persist
+        self.verbose = verbose
+        self.batch_size = max(1, int(batch_size))
+        # Single PCG64 stream for every random draw of this generator
+        self.rng = np.random.default_rng(seed)
+        # Pre-drawn noise rows, consumed one per reading (see _next_noise())
+        self._noise_buf = None
+        self._noise_idx = self.NOISE_BATCH
         self.tick = 0
-        self.current_weather = None
+        # Ticks left until the next weather change (the change happens when it reaches 0)
+        self._ticks_until_weather_change = self.WEATHER_CHANGE_EVERY
+        # Current weather as a Weather value (current_weather exposes the name)
+        self._weather = None
         
-        # Current state values (will be set by initialize())
-        self.current_temperature = None
-        self.current_humidity = None
-        self.current_soil_moisture = None
-        self.current_light_intensity = None
-        self.current_co2_concentration = None
+        # Current state values in METRICS order (will be set by initialize())
+        self.state = np.zeros(len(METRICS), dtype=np.float64)
 
                 # Last computed targets (for logging/debug)
-        self.last_targets = {}
+        self.last_targets = None
+
+        # Target vector for the current weather + equipment; reset to None when either changes
+        self._targets = None
 
+        # In-memory copy of EquipmentStateBits (avoids a DB query every tick)
+        self._equipment_active = {}
+        self._equipment_mask = 0
+
+        # Readings not inserted yet (see batch_size / flush())
+        self._pending = []
+
+        # Change threshold for storing readings (see _should_persist())
+        self.eps = eps
+        self.max_gap = max_gap
+        self._last_persisted_state = np.zeros(len(METRICS), dtype=np.float64)
+        self._last_persisted_tick = None
+
+        # Saving EquipmentStateBits updates the cache (see greenhouse.signals)
+        if persist:
+            live_generators.add(self)
+
+
+    # Scalar views on the state vector (kept for existing callers)
+    current_temperature = _state_property(0)
+    current_humidity = _state_property(1)
+    current_soil_moisture = _state_property(2)
+    current_light_intensity = _state_property(3)
+    current_co2_concentration = _state_property(4)
     
+    @property
+    def current_weather(self):
+        """Current weather name (e.g. 'Sunny'), None before initialize()"""
+        return None if self._weather is None else self.WEATHERS[self._weather]
+
+    @current_weather.setter
+    def current_weather(self, name):
+        self._weather = None if name is None else self.WEATHER_INDEX[name]
+        self._targets = None
+
+    @transaction.atomic
     def initialize(self, clear_data=True):
-        """Initialize the simulation"""
+        """Initialize the simulation (clearing, equipment and first reading in one transaction)"""
         if clear_data:
-            # Clear all previous data
-            GreenhouseReading.objects.all().delete()
-            print(f"Cleared all previous readings")
+            # Clear all previous data (pending readings belong to the old run)
+            self._pending.clear()
+            self._clear_readings()
+            if self.verbose:
+                print(f"Cleared all previous readings")
+
+        # The first reading of a run is always stored
+        self._last_persisted_tick = None
         
         # Get starting config
-        config = self.STARTING_CONFIGS.get(self.config_name, self.STARTING_CONFIGS['optimal'])
+        if self.config_name == 'random':
+            config = self._random_config()
+        else:
+            config = self.STARTING_CONFIGS_STATIC.get(self.config_name, self.STARTING_CONFIGS_STATIC['optimal'])
         
-        # Set initial values (handle random config)
-        self.current_temperature = config['temperature']() if callable(config['temperature']) else config['temperature']
-        self.current_humidity = config['humidity']() if callable(config['humidity']) else config['humidity']
-        self.current_soil_moisture = config['soil_moisture']() if callable(config['soil_moisture']) else config['soil_moisture']
-        self.current_light_intensity = config['light_intensity']() if callable(config['light_intensity']) else config['light_intensity']
-        self.current_co2_concentration = config['co2_concentration']() if callable(config['co2_concentration']) else config['co2_concentration']
-        self.current_weather = config['weather']() if callable(config['weather']) else config['weather']
+        # Set initial values
+        self.state = np.array([config[m] for m in METRICS], dtype=np.float64)
+        self.current_weather = config['weather']
         
         # Initialize equipment states
         self._initialize_equipment(config['equipment'])
@@ -283,161 +419,296 @@ class GreenhouseDataGenerator:
         # Create first reading
         first_reading = self._create_reading()
         
-        print(f"Initialized with config: {self.config_name}")
-        print(f"Starting weather: {self.current_weather}")
-        print(f"Starting conditions: T={self.current_temperature:.1f}°C, H={self.current_humidity:.1f}%, S={self.current_soil_moisture:.1f}%")
+        if self.verbose:
+            print(f"Initialized with config: {self.config_name}")
+            print(f"Starting weather: {self.current_weather}")
+            print(f"Starting conditions: T={self.current_temperature:.1f}°C, H={self.current_humidity:.1f}%, S={self.current_soil_moisture:.1f}%")
         
         return first_reading
     
-    def _compute_targets(self):
-        """Compute all metric targets for the current tick (weather + equipment)."""
-        metrics = [
-            "temperature",
-            "humidity",
-            "soil_moisture",
-            "light_intensity",
-            "co2_concentration",
-        ]
-        return {m: self._calculate_target(m) for m in metrics}
+    @staticmethod
+    def _clear_readings():
+        """Delete every reading without loading them (TRUNCATE on PostgreSQL)"""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'TRUNCATE TABLE "{GreenhouseReading._meta.db_table}" RESTART IDENTITY')
+        else:
+            # Single DELETE statement, no pk collection or signals (nothing cascades to readings)
+            readings = GreenhouseReading.objects.all()
+            readings._raw_delete(readings.db)
 
+    def _random_config(self):
+        """Draw a fresh 'random' starting configuration"""
+        return {
+            'temperature': self.rng.uniform(18.0, 28.0),
+            'humidity': self.rng.uniform(50.0, 80.0),
+            'soil_moisture': self.rng.uniform(40.0, 70.0),
+            'light_intensity': self.rng.uniform(2000.0, 8000.0),
+            'co2_concentration': self.rng.uniform(350.0, 500.0),
+            'weather': self._choice(tuple(self.WEATHER_TARGETS)),
+            'equipment': {eq: bool(self.rng.integers(2)) for eq in EQUIPMENT},
+        }
+
+    def _choice(self, options):
+        """Pick one element of a sequence using the generator's RNG"""
+        return options[self.rng.integers(len(options))]
 
     def _initialize_equipment(self, equipment_config):
         """Initialize or reset equipment states"""
-        for equipment_type, is_active in equipment_config.items():
-            active = is_active() if callable(is_active) else is_active
-            
-            equipment, created = EquipmentState.objects.get_or_create(
-                equipment_type=equipment_type,
-                defaults={'is_active': active}
-            )
-            
-            if not created:
-                equipment.is_active = active
-                equipment.save()
+        self._equipment_active = {}
+        self._equipment_mask = 0
+        self._targets = None
+        for equipment_type, active in equipment_config.items():
+            self.set_equipment(equipment_type, active)
+
+        if not self.persist:
+            return
+
+        # The equipment mask uses the same bit order as EquipmentStateBits
+        EquipmentStateBits.store(self._equipment_mask)
+
+    def refresh_equipment(self):
+        """Reload the equipment cache from EquipmentStateBits (for when other processes change it)"""
+        self.set_equipment_vector(unpack_equipment(EquipmentStateBits.current_bits()).values())
+
+    @property
+    def equipment_state(self):
+        """Cached equipment state: {equipment_type: is_active}"""
+        return self._equipment_active
+
+    def toggle_equipment(self, equipment_type, is_active):
+        """Switch one equipment on/off: writes EquipmentStateBits (when persisting) and the cache"""
+        if self.persist:
+            EquipmentStateBits.set_equipment(equipment_type, bool(is_active))
+        self.set_equipment(equipment_type, is_active)
+
+    def set_equipment(self, equipment_type, is_active):
+        """Update the cached state of one equipment (does not write the DB)"""
+        self._equipment_active[equipment_type] = bool(is_active)
+        bit = EQUIPMENT_BITS.get(equipment_type, 0)
+        mask = self._equipment_mask | bit if is_active else self._equipment_mask & ~bit
+        if mask != self._equipment_mask:
+            self._equipment_mask = mask
+            self._targets = None
+
+    def set_equipment_vector(self, states):
+        """Update the cached state of all equipment from a sequence in EQUIPMENT order"""
+        mask = 0
+        for i, (equipment_type, is_active) in enumerate(zip(EQUIPMENT, states)):
+            self._equipment_active[equipment_type] = bool(is_active)
+            if is_active:
+                mask |= 1 << i
+        if mask != self._equipment_mask:
+            self._equipment_mask = mask
+            self._targets = None
     
     def generate_reading(self, show_targets: bool = False):
         """Generate the next sensor reading"""
+        noisy = self.generate_values()
+
+        # Create and return reading
+        reading = self._create_reading(noisy)
+
+        # OPTIONAL: print targets each tick
+        if show_targets:
+            self._print_tick_debug(reading, self.last_targets)
+
+        return reading
+
+    def generate_values(self):
+        """
+        Advance one tick and return the noisy sensor values (METRICS order) without
+        creating or storing a GreenhouseReading (for in-memory runs).
+        """
         self.tick += 1
 
         # Check if weather should change
-        if self.tick % 40 == 0:
+        self._ticks_until_weather_change -= 1
+        if not self._ticks_until_weather_change:
             self._change_weather()
+            self._ticks_until_weather_change = self.WEATHER_CHANGE_EVERY
 
         # NEW: calculate all targets once per tick (and reuse)
         targets = self._calculate_targets()
         self.last_targets = targets
 
-        # Move toward targets
-        self._move_toward_targets(targets)
-        self._constrain_values()
+        # Move toward targets, constrain and add sensor noise (single kernel call)
+        return sim_step(
+            self.state, targets, self.CONVERGENCE, self.LOW, self.HIGH, self.NOISE, self._next_noise()
+        )
 
-        # Create and return reading
-        reading = self._create_reading()
+    def generate_many(self, n, show_targets: bool = False):
+        """
+        Generate the next n readings in one vectorized pass (headless/backfill runs).
+
+        Equipment is held constant, so the target only changes with the weather.
+        Within each weather segment the state follows the closed form
+        target + (state0 - target) * (1 - convergence) ** k, clamped to the
+        bounds (equal to clamping every tick, since the approach is monotone).
+        Readings are inserted with bulk_create when persisting (same eps / max_gap
+        filter as generate_reading).
+        """
+        if n <= 0:
+            return []
+
+        states = np.empty((n, len(METRICS)), dtype=np.float64)
+        segment_targets = np.empty_like(states)
+        first_tick = self.tick + 1
+        decay = 1.0 - self.CONVERGENCE
+
+        # Weather for every tick up front; each run of equal weather is one segment
+        plan = self._plan_weather_sequence(n)
+        bounds = (np.flatnonzero(np.diff(plan)) + 1).tolist()
+
+        for start, end in zip([0] + bounds, bounds + [n]):
+            weather = plan[start]
+            if weather != self._weather:
+                self.tick = first_tick + start
+                self._set_weather(Weather(weather))
+
+            targets = self._calculate_targets()
+            steps = np.arange(1, end - start + 1, dtype=np.float64)[:, None]
+            segment = states[start:end]
+            np.multiply(self.state - targets, decay ** steps, out=segment)
+            segment += targets
+            np.clip(segment, self.LOW, self.HIGH, out=segment)
+
+            segment_targets[start:end] = targets
+            self.state[:] = segment[-1]
+
+        self.tick = first_tick + n - 1
+        self._ticks_until_weather_change = (self._ticks_until_weather_change - n - 1) % self.WEATHER_CHANGE_EVERY + 1
+        weathers = [self.WEATHERS[i] for i in plan.tolist()]
+        ticks = range(first_tick, first_tick + n)
+        self.last_targets = targets
+        noisy = states * (1.0 + self.NOISE * self.rng.uniform(-1.0, 1.0, states.shape))
+
+        readings = [
+            GreenhouseReading(**dict(zip(METRICS, values)), weather=weather, tick=tick)
+            for values, weather, tick in zip(noisy.tolist(), weathers, ticks)
+        ]
+        if self.persist:
+            self.flush()
+            if self.eps > 0:
+                # The filter depends on the last stored row, so it runs row by row
+                stored = [r for r, state, tick in zip(readings, states, ticks) if self._should_persist(state, tick)]
+            else:
+                stored = readings
+                self._last_persisted_state[:] = states[-1]
+                self._last_persisted_tick = ticks[-1]
+            GreenhouseReading.objects.bulk_create(stored, batch_size=500)
 
-        # OPTIONAL: print targets each tick
         if show_targets:
-            self._print_tick_debug(reading, targets)
+            for reading, targets in zip(readings, segment_targets):
+                self._print_tick_debug(reading, targets)
 
-        return reading
+        return readings
 
     # ---------- NEW helpers ----------
 
     def _calculate_targets(self):
-        """Calculate targets for all metrics based on weather + currently active equipment."""
-        # Start with weather targets
-        targets = dict(self.WEATHER_TARGETS[self.current_weather])
-
-        # Add equipment modifications (query active equipment ONCE)
-        active_equipment = EquipmentState.objects.filter(is_active=True)
-        for equipment in active_equipment:
-            equipment_mod = self.EQUIPMENT_TARGETS.get(equipment.equipment_type, {})
-            for metric, delta in equipment_mod.items():
-                targets[metric] = targets.get(metric, 0) + delta
+        """Calculate the target vector (METRICS order) from weather + currently active equipment."""
+        if self._targets is None:
+            self._targets = self._target_vector(self._weather, self._equipment_mask)
+        return self._targets
 
-        return targets
+    def _target_vector(self, weather, equipment_mask):
+        """Weather targets + modifiers of the equipment in the bitmask (fresh array)"""
+        return self.WEATHER_TARGETS_MATRIX[weather] + self.EQUIPMENT_SUM_TABLE[equipment_mask]
 
-    def _print_tick_debug(self, reading: GreenhouseReading, targets: dict):
+    def _print_tick_debug(self, reading: GreenhouseReading, targets: np.ndarray):
         """Pretty debug output for current values + targets."""
+        t, h, s, l, co2 = targets
         print(
             f"[TARGET |"
             f"CUR:  T={reading.temperature:5.2f}°C  H={reading.humidity:5.2f}%  "
             f"S={reading.soil_moisture:5.2f}%  L={reading.light_intensity:7.0f}lx  "
             f"CO2={reading.co2_concentration:6.0f}ppm | "
-            f"TGT:  T={targets['temperature']:5.2f}°C  H={targets['humidity']:5.2f}%  "
-            f"S={targets['soil_moisture']:5.2f}%  L={targets['light_intensity']:7.0f}lx  "
-            f"CO2={targets['co2_concentration']:6.0f}ppm"
+            f"TGT:  T={t:5.2f}°C  H={h:5.2f}%  "
+            f"S={s:5.2f}%  L={l:7.0f}lx  "
+            f"CO2={co2:6.0f}ppm"
         )
 
-    # ---------- UPDATED move_toward_targets ----------
+    def _change_weather(self):
+        """Change weather based on transition rules"""
+        self._set_weather(self._next_weather(self._weather))
 
-    def _move_toward_targets(self, targets: dict):
-        """Move all metrics toward their target values"""
+    def _next_weather(self, weather):
+        """Random next Weather after `weather` (transition rules)"""
+        return self._choice(self.WEATHER_NEXT.get(weather, (Weather.Clear_sky,)))
 
-        # Temperature
-        convergence = self.CONVERGENCE_RATES['temperature']
-        self.current_temperature += (targets['temperature'] - self.current_temperature) * convergence
+    def _plan_weather_sequence(self, n_ticks):
+        """
+        Weather value for each of the next n_ticks ticks.
 
-        # Humidity
-        convergence = self.CONVERGENCE_RATES['humidity']
-        self.current_humidity += (targets['humidity'] - self.current_humidity) * convergence
+        Walks the transition chain once per weather change (same draws as
+        ticking one by one); the generator's own weather is not changed.
+        """
+        plan = np.empty(n_ticks, dtype=np.intp)
+        weather = self._weather
+        # Ticks before the next change, then whole periods starting at each change tick
+        length = self._ticks_until_weather_change - 1
+        start = 0
+        while start < n_ticks:
+            length = min(n_ticks - start, length)
+            plan[start:start + length] = weather
+            start += length
+            if start < n_ticks:
+                weather = self._next_weather(weather)
+            length = self.WEATHER_CHANGE_EVERY
+        return plan
 
-        # Soil Moisture
-        convergence = self.CONVERGENCE_RATES['soil_moisture']
-        self.current_soil_moisture += (targets['soil_moisture'] - self.current_soil_moisture) * convergence
+    def _set_weather(self, new_weather):
+        """Switch to new_weather (a Weather; targets are recomputed on the next tick)"""
+        if self.verbose:
+            print(f"[Tick {self.tick}] Weather changed: {self.current_weather} → {self.WEATHERS[new_weather]}")
+        self._weather = new_weather
+        self._targets = None
+    
+    def _next_noise(self):
+        """Next row of uniform(-1, 1) noise (METRICS order), refilled NOISE_BATCH rows at a time"""
+        if self._noise_idx == self.NOISE_BATCH:
+            self._noise_buf = self.rng.uniform(-1.0, 1.0, (self.NOISE_BATCH, len(METRICS)))
+            self._noise_idx = 0
+        row = self._noise_buf[self._noise_idx]
+        self._noise_idx += 1
+        return row
 
-        # Light Intensity
-        convergence = self.CONVERGENCE_RATES['light_intensity']
-        self.current_light_intensity += (targets['light_intensity'] - self.current_light_intensity) * convergence
+    def _create_reading(self, noisy=None):
+        """Create a greenhouse reading (saved to the DB when persist is on)
 
-        # CO2 Concentration
-        convergence = self.CONVERGENCE_RATES['co2_concentration']
-        self.current_co2_concentration += (targets['co2_concentration'] - self.current_co2_concentration) * convergence
+        noisy: sensor values in METRICS order; when omitted, noise is added
+        to the current state here.
+        """
+        if noisy is None:
+            # Realistic sensor noise, drawn for all metrics at once
+            noisy = self.state * (1 + self.NOISE * self._next_noise())
 
-    
-    def _change_weather(self):
-        """Change weather based on transition rules"""
-        possible_weathers = self.WEATHER_TRANSITIONS.get(self.current_weather, ['Clear_sky'])
-        new_weather = random.choice(possible_weathers)
-        
-        print(f"[Tick {self.tick}] Weather changed: {self.current_weather} → {new_weather}")
-        self.current_weather = new_weather
-    
-    # def _calculate_target(self, metric):
-    #     """Calculate the target value for a metric based on weather and equipment"""
-    #     # Start with weather target
-    #     target = self.WEATHER_TARGETS[self.current_weather].get(metric, 0)
-        
-    #     # Add equipment modifications
-    #     active_equipment = EquipmentState.objects.filter(is_active=True)
-    #     for equipment in active_equipment:
-    #         equipment_mod = self.EQUIPMENT_TARGETS.get(equipment.equipment_type, {})
-    #         target += equipment_mod.get(metric, 0)
-    #     return target
-    
-    
-    def _constrain_values(self):
-        """Keep values within realistic bounds"""
-        self.current_temperature = max(0, min(50, self.current_temperature))
-        self.current_humidity = max(0, min(100, self.current_humidity))
-        self.current_soil_moisture = max(0, min(100, self.current_soil_moisture))
-        self.current_light_intensity = max(0, min(100000, self.current_light_intensity))
-        self.current_co2_concentration = max(300, min(2000, self.current_co2_concentration))
-    
-    def _add_noise(self, value, noise_percent=1.0):
-        """Add realistic sensor noise"""
-        noise = value * (noise_percent / 100.0)
-        return value + random.uniform(-noise, noise)
-    
-    def _create_reading(self):
-        """Create and save a greenhouse reading"""
-        reading = GreenhouseReading.objects.create(
-            temperature=self._add_noise(self.current_temperature, 0.5),
-            humidity=self._add_noise(self.current_humidity, 1.0),
-            soil_moisture=self._add_noise(self.current_soil_moisture, 1.5),
-            light_intensity=self._add_noise(self.current_light_intensity, 2.0),
-            co2_concentration=self._add_noise(self.current_co2_concentration, 1.0),
+        reading = GreenhouseReading(
+            **dict(zip(METRICS, noisy.tolist())),
             weather=self.current_weather,
             tick=self.tick
         )
+        if self.persist and self._should_persist(self.state, self.tick):
+            self._pending.append(reading)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
         
-        return reading
\ No newline at end of file
+        return reading
+
+    def _should_persist(self, state, tick):
+        """False when the state barely moved since the last stored reading (eps / max_gap)"""
+        last_tick = self._last_persisted_tick
+        if self.eps > 0 and last_tick is not None and (self.max_gap is None or tick - last_tick < self.max_gap):
+            if np.max(np.abs(state - self._last_persisted_state) / self.SCALE) < self.eps:
+                return False
+
+        self._last_persisted_state[:] = state
+        self._last_persisted_tick = tick
+        return True
+
+    def flush(self):
+        """Insert all pending readings (one bulk INSERT)"""
+        if self._pending:
+            GreenhouseReading.objects.bulk_create(self._pending, batch_size=500)
+            self._pending.clear()
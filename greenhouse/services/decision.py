@@ -1,5 +1,21 @@
-from dataclasses import dataclass
-from greenhouse.models import GreenhouseReading, GreenhouseCommand, EquipmentState
+import math
+from bisect import bisect_right
+from dataclasses import astuple, dataclass
+
+import numpy as np
+
+from greenhouse.models import EQUIPMENT, GreenhouseReading, GreenhouseCommand, EquipmentStateBits, pack_equipment
+from greenhouse.services.kernels import HAS_NUMBA, rule_lookup
+
+# Equipment bit i <-> EQUIPMENT[i] (states and commands packed into one byte)
+_BIT_WEIGHTS = tuple((name, 1 << bit) for bit, name in enumerate(EQUIPMENT))
+# Command bits -> equipment booleans in EQUIPMENT order
+COMMAND_BITS = tuple(
+    tuple(bool(bits & weight) for _, weight in _BIT_WEIGHTS) for bits in range(1 << len(EQUIPMENT))
+)
+_COMMAND_FIELDS = tuple(
+    {name: bool(bits & weight) for name, weight in _BIT_WEIGHTS} for bits in range(1 << len(EQUIPMENT))
+)
 
 
 @dataclass
@@ -30,151 +46,178 @@ class GreenhouseThresholds:
 class GreenhouseDecisionModel:
     """
     Rule-based controller that:
-      - Uses EquipmentState (DB) as the source of truth
+      - Uses EquipmentStateBits (DB) as the source of truth, unless the caller passes the current state
+        (equipment_state dict, or last_command when the previous command was applied as-is)
       - Applies hysteresis (buffers)
       - Resolves cross-effects between equipments (ventilation vs CO2, irrigation vs humidity, lights vs temperature, etc.)
     """
 
     def __init__(self, config: GreenhouseThresholds | None = None):
         self.config = config if config else GreenhouseThresholds()
-
-    def decide(self, prediction: GreenhouseReading) -> GreenhouseCommand:
+        self._bounds = _rule_boundaries(self.config)
+        self._edges = tuple(_bucket_edges(b) for b in self._bounds)
+        self._sizes = tuple(len(e) + 1 for e in self._edges)
+        self._table = _decision_table(self)
+
+        # Same edges as arrays for the compiled lookup (rows padded with +inf)
+        self._edge_matrix = np.full((len(self._edges), max(map(len, self._edges))), np.inf)
+        for i, edges in enumerate(self._edges):
+            self._edge_matrix[i, :len(edges)] = edges
+        self._edge_counts = np.array([len(e) for e in self._edges], dtype=np.int64)
+        self._size_array = np.array(self._sizes, dtype=np.int64)
+
+    def decide_bits(self, values: np.ndarray, state: int) -> int:
+        """
+        decide() on packed data, without model instances: values are the 5 metrics
+        (float64, GreenhouseReading field order), state/result are equipment bits
+        (bit i = EQUIPMENT[i]).
+        """
+        if HAS_NUMBA:
+            return int(rule_lookup(values, state, self._edge_matrix, self._edge_counts, self._size_array, self._table))
+        return int(self._lookup(values, state))
+
+    def _lookup(self, values, state: int):
+        key = 0
+        for edges, size, x in zip(self._edges, self._sizes, values):
+            key = key * size + bisect_right(edges, x)
+        return self._table[key, state]
+
+    def decide(
+        self,
+        prediction: GreenhouseReading,
+        equipment_state: dict | None = None,
+        last_command: GreenhouseCommand | None = None,
+    ) -> GreenhouseCommand:
         # ---- Read current equipment state (source of truth) ----
-        equipment_state = {
-            e.equipment_type: e.is_active for e in EquipmentState.objects.all()
-        }
-
-        # Helper to safely read current state
-        def is_on(name: str) -> bool:
-            return bool(equipment_state.get(name, False))
-
-        # ---- Start from "keep current state" (good for stability) ----
-        cmd = GreenhouseCommand(
-            heater=is_on("heater"),
-            ventilation=is_on("ventilation"),
-            irrigation=is_on("irrigation"),
-            co2_injector=is_on("co2_injector"),
-            lights=is_on("lights"),
-            dehumidifier=is_on("dehumidifier"),
-            light_blinds=is_on("light_blinds"),
+        # Callers that track the state in memory pass it in and skip the query.
+        if last_command is not None:
+            state = pack_equipment({name: getattr(last_command, name) for name in EQUIPMENT})
+        elif equipment_state is None:
+            state = EquipmentStateBits.current_bits()
+        else:
+            state = pack_equipment(equipment_state)
+
+        # ---- Look the command up in the rule table (see _decision_table) ----
+
+        values = (
+            prediction.temperature, prediction.humidity, prediction.soil_moisture,
+            prediction.light_intensity, prediction.co2_concentration,
+        )
+        return GreenhouseCommand(**_COMMAND_FIELDS[self._lookup(values, state)])
+
+    def decide_batch(self, predictions: np.ndarray, equipment_states: np.ndarray) -> np.ndarray:
+        """
+        The control rules, vectorized over many rows at once (no Python branches).
+        decide() looks its answers up in a table generated from this method.
+
+        predictions: (K, 5) in temperature, humidity, soil_moisture,
+        light_intensity, co2_concentration order.
+        equipment_states: (K, 7) current equipment booleans in EQUIPMENT order.
+        Returns the (K, 7) bool command matrix in EQUIPMENT order.
+
+        Every threshold compared against here must also be listed in _rule_boundaries().
+        """
+        c = self.config
+        T, H, S, L, CO2 = np.asarray(predictions, dtype=np.float64).T
+        heater_on, vent_on, irr_on, co2_on, lights_on, dehum_on, blinds_on = (
+            np.asarray(equipment_states, dtype=bool).T
         )
 
-        # ============================================================
-        # 1) TEMPERATURE CONTROL (safety-ish priority)
-        # ============================================================
-        # Heater: turn on if below min; if on, turn off only above min+buffer
-        if prediction.temperature < self.config.TEMP_MIN:
-            cmd.heater = True
-        elif is_on("heater"):
-            cmd.heater = prediction.temperature <= (self.config.TEMP_MIN + self.config.TEMP_BUFFER)
-        else:
-            cmd.heater = False
+        # 1) Temperature (with heater/ventilation conflict)
+        heater = (T < c.TEMP_MIN) | (heater_on & (T <= c.TEMP_MIN + c.TEMP_BUFFER))
+        vent = (T > c.TEMP_MAX) | (vent_on & (T >= c.TEMP_MAX - c.TEMP_BUFFER))
+        both = heater & vent
+        overheating = T > c.TEMP_MAX
+        heater = heater & ~(both & overheating)
+        vent = vent & ~(both & ~overheating)
+
+        # 2) Light
+        too_bright = L > c.LIGHT_MAX_STRESS
+        too_dark = ~too_bright & (L < c.LIGHT_MIN_GROWTH)
+        light_ok = ~too_bright & ~too_dark
+        blinds = too_bright | (light_ok & blinds_on)
+        lights = (too_dark & (T < c.TEMP_MAX - 0.5)) | (light_ok & lights_on)
+
+        # 3) Humidity
+        hum_high = H > c.HUM_MAX
+        hum_mid = ~hum_high & (H >= c.HUM_MIN)
+        warm = T > c.TEMP_MIN + 0.5
+        vent = vent | (hum_high & warm)
+        dehum = (hum_high & ~warm) | (hum_mid & dehum_on & (H >= c.HUM_MAX - c.HUM_BUFFER))
+
+        # 4) Soil moisture
+        dry = S < c.SOIL_MIN
+        irrigation = (dry & (H <= c.HUM_MAX - 2.0)) | (~dry & irr_on & (S <= c.SOIL_MIN + c.SOIL_BUFFER))
+
+        # 5) CO2 (never while ventilating)
+        co2 = ~vent & ((CO2 < c.CO2_MIN) | (co2_on & (CO2 <= c.CO2_MIN + c.CO2_BUFFER)))
+
+        # Final conflict resolution pass
+        cooling = vent & (T >= c.TEMP_MAX)
+        lights = lights & ~cooling
+        dehum = dehum & ~cooling
+        vent = vent & ~(heater & (T <= c.TEMP_MIN) & (H <= c.HUM_MAX + 5.0))
+
+        return np.stack([heater, vent, irrigation, co2, lights, dehum, blinds], axis=1)
+
+
+def _rule_boundaries(c: GreenhouseThresholds) -> tuple[tuple[float, ...], ...]:
+    """
+    Every value decide_batch() compares each input against, per input
+    (temperature, humidity, soil_moisture, light_intensity, co2_concentration).
+    """
+    bounds = (
+        (c.TEMP_MIN, c.TEMP_MIN + 0.5, c.TEMP_MIN + c.TEMP_BUFFER, c.TEMP_MAX - c.TEMP_BUFFER, c.TEMP_MAX - 0.5, c.TEMP_MAX),
+        (c.HUM_MIN, c.HUM_MAX - c.HUM_BUFFER, c.HUM_MAX - 2.0, c.HUM_MAX, c.HUM_MAX + 5.0),
+        (c.SOIL_MIN, c.SOIL_MIN + c.SOIL_BUFFER),
+        (c.LIGHT_MIN_GROWTH, c.LIGHT_MAX_STRESS),
+        (c.CO2_MIN, c.CO2_MIN + c.CO2_BUFFER),
+    )
+    return tuple(tuple(sorted(set(b))) for b in bounds)
 
-        # Ventilation: turn on if above max; if on, turn off only below max-buffer
-        if prediction.temperature > self.config.TEMP_MAX:
-            cmd.ventilation = True
-        elif is_on("ventilation"):
-            cmd.ventilation = prediction.temperature >= (self.config.TEMP_MAX - self.config.TEMP_BUFFER)
-        else:
-            cmd.ventilation = False
-
-        # Conflict: don't heat and ventilate at the same time (wastes energy)
-        # If both would be True, prefer ventilation when overheating, else heater.
-        if cmd.heater and cmd.ventilation:
-            if prediction.temperature > self.config.TEMP_MAX:
-                cmd.heater = False
-            else:
-                cmd.ventilation = False
-
-        # ============================================================
-        # 2) LIGHT CONTROL (depends on temperature)
-        # ============================================================
-        # Too bright -> use blinds
-        if prediction.light_intensity > self.config.LIGHT_MAX_STRESS:
-            cmd.light_blinds = True
-            cmd.lights = False  # don't add more light
-
-        # Too dark -> use lights, but avoid if we're overheating
-        elif prediction.light_intensity < self.config.LIGHT_MIN_GROWTH:
-            cmd.light_blinds = False
-            # If near/above max temp, don't force lights (they add heat in your generator)
-            if prediction.temperature >= (self.config.TEMP_MAX - 0.5):
-                cmd.lights = False
-            else:
-                cmd.lights = True
-
-        # Optimal band -> keep current (already initialized)
-        else:
-            cmd.lights = is_on("lights")
-            cmd.light_blinds = is_on("light_blinds")
-
-        # ============================================================
-        # 3) HUMIDITY CONTROL (ventilation affects humidity)
-        # ============================================================
-        # If humidity too high:
-        #   - Prefer ventilation if it won't cause under-temp
-        #   - Else use dehumidifier
-        if prediction.humidity > self.config.HUM_MAX:
-            if prediction.temperature > (self.config.TEMP_MIN + 0.5):
-                cmd.ventilation = True
-                cmd.dehumidifier = False
-            else:
-                cmd.dehumidifier = True
-
-        # If humidity too low: dehumidifier off
-        elif prediction.humidity < self.config.HUM_MIN:
-            cmd.dehumidifier = False
-
-        # Hysteresis for dehumidifier if currently on
-        elif is_on("dehumidifier"):
-            # keep it on until safely below HUM_MAX - buffer
-            cmd.dehumidifier = prediction.humidity >= (self.config.HUM_MAX - self.config.HUM_BUFFER)
-        else:
-            cmd.dehumidifier = False
-
-        # ============================================================
-        # 4) SOIL MOISTURE CONTROL (irrigation increases humidity in your generator)
-        # ============================================================
-        # If soil is too dry -> irrigate, unless humidity already too high
-        if prediction.soil_moisture < self.config.SOIL_MIN:
-            if prediction.humidity > (self.config.HUM_MAX - 2.0):
-                cmd.irrigation = False
-            else:
-                cmd.irrigation = True
-
-        # Hysteresis if currently irrigating: stop only above SOIL_MIN + buffer
-        elif is_on("irrigation"):
-            cmd.irrigation = prediction.soil_moisture <= (self.config.SOIL_MIN + self.config.SOIL_BUFFER)
-        else:
-            cmd.irrigation = False
-
-        # ============================================================
-        # 5) CO2 CONTROL (ventilation lowers CO2 in your generator)
-        # ============================================================
-        # If ventilation is on, don't inject CO2 (otherwise you're "fighting yourself").
-        if cmd.ventilation:
-            cmd.co2_injector = False
-        else:
-            # Turn on if below min; if on, turn off only above min+buffer
-            if prediction.co2_concentration < self.config.CO2_MIN:
-                cmd.co2_injector = True
-            elif is_on("co2_injector"):
-                cmd.co2_injector = prediction.co2_concentration <= (self.config.CO2_MIN + self.config.CO2_BUFFER)
-            else:
-                cmd.co2_injector = False
-
-        # ============================================================
-        # FINAL CONFLICT RESOLUTION PASS (small but important)
-        # ============================================================
-        # If we’re ventilating to cool/dry, avoid adding heat sources if not necessary.
-        if cmd.ventilation and prediction.temperature >= self.config.TEMP_MAX:
-            cmd.lights = False  # lights add heat in your generator
-            # dehumidifier generally unnecessary if ventilation is already running
-            cmd.dehumidifier = False
-
-        # If we’re heating because it's cold, avoid ventilation unless humidity is dangerously high.
-        if cmd.heater and prediction.temperature <= self.config.TEMP_MIN:
-            if prediction.humidity <= (self.config.HUM_MAX + 5.0):
-                cmd.ventilation = False
-
-        return cmd
+
+def _bucket_edges(bounds: tuple[float, ...]) -> list[float]:
+    """
+    [b0, next float after b0, b1, ...]: bisect_right(edges, x) is then 2k when x is
+    strictly between bounds[k-1] and bounds[k] and 2k+1 when x == bounds[k]
+    (so < and <= against the same bound fall into different buckets).
+    """
+    edges = []
+    for b in bounds:
+        edges += [b, math.nextafter(b, math.inf)]
+    return edges
+
+
+def _representatives(bounds: tuple[float, ...]) -> np.ndarray:
+    """One input value per bucket (bucket i -> values[i])"""
+    values = [bounds[0] - 1.0]
+    for lo, hi in zip(bounds, bounds[1:]):
+        values += [lo, (lo + hi) / 2.0]
+    values += [bounds[-1], bounds[-1] + 1.0]
+    return np.asarray(values, dtype=np.float64)
+
+
+# Decision tables shared by models with the same thresholds
+_TABLES: dict[tuple, np.ndarray] = {}
+
+
+def _decision_table(model: GreenhouseDecisionModel) -> np.ndarray:
+    """
+    (buckets, 128) uint8 table: row = combined input bucket, column = current equipment
+    bits, value = command bits (both in EQUIPMENT order). Inputs in the same bucket
+    satisfy exactly the same comparisons, so one decide_batch() run per bucket and
+    equipment state covers every possible input.
+    """
+    key = astuple(model.config)
+    table = _TABLES.get(key)
+    if table is None:
+        grid = np.meshgrid(*[_representatives(b) for b in model._bounds], indexing="ij")
+        predictions = np.stack([g.ravel() for g in grid], axis=1)
+        weights = 1 << np.arange(len(EQUIPMENT))
+
+        table = np.empty((len(predictions), 1 << len(EQUIPMENT)), dtype=np.uint8)
+        for state in range(table.shape[1]):
+            states = np.broadcast_to((state & weights) != 0, (len(predictions), len(EQUIPMENT)))
+            table[:, state] = model.decide_batch(predictions, states) @ weights
+        _TABLES[key] = table
+    return table
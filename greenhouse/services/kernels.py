@@ -0,0 +1,98 @@
+"""
+Numeric kernels for the simulation hot paths.
+
+Numba is optional: when it is installed the kernels are JIT-compiled
+(and cached on disk), otherwise the same functions run as plain NumPy.
+The compile cache goes to __pycache__ next to this file; set
+NUMBA_CACHE_DIR when that is read-only (e.g. a container image).
+"""
+from __future__ import annotations
+
+import numpy as np
+
+try:
+    from numba import njit
+
+    HAS_NUMBA = True
+except ImportError:  # numba not installed -> run the kernels as regular Python
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+
+@njit(cache=True, fastmath=True)
+def sim_step(state, target, convergence, low, high, noise, rand):
+    """
+    One simulation tick on the metric state vector (updated in place):
+    move toward target, clamp to [low, high], return the noisy sensor values.
+
+    rand holds one uniform draw in [-1, 1) per metric.
+    """
+    state += (target - state) * convergence
+    state[:] = np.minimum(np.maximum(state, low), high)
+    return state * (1.0 + noise * rand)
+
+
+@njit(cache=True)
+def forest_margin(x, feature, threshold, left, right, margin,
+                  node_offsets, value_offsets, tree_out, tree_nout, n_out):
+    """
+    Walk every tree of a flattened forest for one sample x (float32 features).
+
+    Trees are concatenated into flat node arrays; tree t starts at node_offsets[t]
+    (children are tree-local indices, leaves have left == -1). Each leaf stores one
+    margin per output it votes on (P(class 1) - P(class 0)) at
+    value_offsets[t] + leaf * tree_nout[t], added into outputs tree_out[t]...
+
+    Returns the summed margins, one per output (> 0 means class 1 wins).
+    """
+    acc = np.zeros(n_out)
+    for t in range(node_offsets.shape[0]):
+        base = node_offsets[t]
+        node = 0
+        while left[base + node] != -1:
+            if x[feature[base + node]] <= threshold[base + node]:
+                node = left[base + node]
+            else:
+                node = right[base + node]
+        nout = tree_nout[t]
+        v = value_offsets[t] + node * nout
+        o = tree_out[t]
+        for k in range(nout):
+            acc[o + k] += margin[v + k]
+    return acc
+
+
+@njit(cache=True)
+def rule_lookup(values, state, edges, n_edges, sizes, table):
+    """
+    Rule-table decision for one sample (see decision.GreenhouseDecisionModel).
+
+    values: the 5 metrics; state: current equipment bits. Row i of edges holds
+    the n_edges[i] bucket edges of metric i (padding after that is ignored).
+    Returns the command bits.
+    """
+    key = 0
+    for i in range(values.shape[0]):
+        key = key * sizes[i] + np.searchsorted(edges[i, :n_edges[i]], values[i], side="right")
+    return table[key, state]
+
+
+@njit(cache=True)
+def forest_margin_binned(x, bins, bin_offsets, feature, threshold_bin, left, right, margin,
+                         node_offsets, value_offsets, tree_out, tree_nout, n_out):
+    """
+    forest_margin() on quantized inputs. bins[bin_offsets[f]:bin_offsets[f + 1]] are the
+    sorted distinct thresholds of feature f and threshold_bin the index of each node's
+    threshold in them; q = (number of thresholds < x[f]) then gives
+    x[f] <= threshold  <=>  q <= threshold_bin, so every decision is unchanged.
+    """
+    q = np.empty(x.shape[0], dtype=np.int64)
+    for f in range(x.shape[0]):
+        q[f] = np.searchsorted(bins[bin_offsets[f]:bin_offsets[f + 1]], np.float64(x[f]), side="left")
+    return forest_margin(q, feature, threshold_bin, left, right, margin,
+                         node_offsets, value_offsets, tree_out, tree_nout, n_out)
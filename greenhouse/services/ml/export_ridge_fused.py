@@ -0,0 +1,26 @@
+import argparse
+from pathlib import Path
+
+from greenhouse.services.ml.ridge_predictor import FUSED_NAME, export_fused
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f"Export the fused ridge predictor (W, b) to {FUSED_NAME} for fast loading."
+    )
+    parser.add_argument(
+        "--model", default="trained_models/ridge_next_tick.joblib",
+        help="ridge_next_tick.joblib bundle to export"
+    )
+    parser.add_argument(
+        "--output", default=None,
+        help=f"Output .npz (default: {FUSED_NAME} next to the bundle)"
+    )
+    args = parser.parse_args()
+
+    out_path = export_fused(Path(args.model), args.output)
+    print(f"Saved fused predictor -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
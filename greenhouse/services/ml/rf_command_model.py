@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+from collections import OrderedDict
 from pathlib import Path
 import joblib
-import pandas as pd
+import numpy as np
+
+from greenhouse.services.kernels import HAS_NUMBA, forest_margin_binned
 
 EQUIPMENT = [
     "heater", "ventilation", "irrigation",
@@ -16,17 +19,189 @@ FEATURES = [
 ]
 
 
+# Written by train_RF.py: one multi-output forest, columns in EQUIPMENT order
+COMBINED_MODEL_NAME = "rf_commands.joblib"
+
+
+def _prepare(clf, label: str):
+    # Models were fit on a DataFrame: check the column order once, then predict on a
+    # plain ndarray (no per-call feature-name validation)
+    trained_on = getattr(clf, "feature_names_in_", None)
+    if trained_on is not None:
+        if list(trained_on) != FEATURES:
+            raise ValueError(f"{label}: trained on {list(trained_on)}, expected {FEATURES}")
+        del clf.feature_names_in_
+    # One row per call: a thread pool costs far more than it saves
+    clf.n_jobs = 1
+    return clf
+
+
+def _flatten_forests(forests):
+    """
+    Concatenate the trees of [(forest, first_output), ...] into the flat arrays
+    forest_margin_binned() walks, plus the (lo, hi) class label of every output.
+
+    Returns None when an output is not binary (left to sklearn).
+    """
+    feature, threshold, left, right, margin = [], [], [], [], []
+    node_offsets, value_offsets, tree_out, tree_nout = [], [], [], []
+    labels = {}
+    n_nodes = n_values = 0
+
+    for clf, first in forests:
+        n_out = clf.n_outputs_
+        classes = clf.classes_ if n_out > 1 else [clf.classes_]
+        for k, cls in enumerate(classes):
+            if len(cls) > 2:
+                return None
+            # sklearn predicts classes[argmax(mean proba)]: ties go to classes[0]
+            labels[first + k] = (bool(cls[0]), bool(cls[-1]))
+
+        for est in clf.estimators_:
+            tree = est.tree_
+            value = tree.value
+            if value.shape[2] == 2:
+                proba = value / value.sum(axis=2, keepdims=True)
+                leaf_margin = proba[:, :, 1] - proba[:, :, 0]
+            else:  # single-class outputs only (lo == hi, the margin is irrelevant)
+                leaf_margin = np.zeros(value.shape[:2])
+
+            feature.append(tree.feature)
+            threshold.append(tree.threshold)
+            left.append(tree.children_left)
+            right.append(tree.children_right)
+            margin.append(leaf_margin.ravel())
+            node_offsets.append(n_nodes)
+            value_offsets.append(n_values)
+            tree_out.append(first)
+            tree_nout.append(n_out)
+            n_nodes += tree.node_count
+            n_values += leaf_margin.size
+
+    feature = np.concatenate(feature)
+    threshold = np.concatenate(threshold).astype(np.float64)
+    left = np.concatenate(left)
+    bins, bin_offsets, threshold_bin = _quantize_thresholds(feature, threshold, left != -1)
+
+    arrays = (
+        bins,
+        bin_offsets,
+        np.where(left != -1, feature, 0).astype(np.uint8),  # leaves: never read
+        threshold_bin,
+        left.astype(np.int32),
+        np.concatenate(right).astype(np.int32),
+        np.concatenate(margin).astype(np.float64),
+        np.asarray(node_offsets, dtype=np.int64),
+        np.asarray(value_offsets, dtype=np.int64),
+        np.asarray(tree_out, dtype=np.int64),
+        np.asarray(tree_nout, dtype=np.int64),
+        len(labels),
+    )
+    return arrays, [labels[j] for j in range(len(labels))]
+
+
+def _quantize_thresholds(feature, threshold, is_split):
+    """
+    Per feature, the sorted distinct split thresholds (concatenated, with offsets) and
+    each node's threshold as an index into them, in the smallest unsigned dtype that
+    holds it (see kernels.forest_margin_binned).
+    """
+    bins, bin_offsets = [], [0]
+    threshold_bin = np.zeros(len(threshold), dtype=np.int64)
+    for f in range(len(FEATURES)):
+        nodes = is_split & (feature == f)
+        values = np.unique(threshold[nodes])
+        threshold_bin[nodes] = np.searchsorted(values, threshold[nodes])
+        bins.append(values)
+        bin_offsets.append(bin_offsets[-1] + len(values))
+
+    largest = max(np.diff(bin_offsets))
+    dtype = np.uint8 if largest <= 0xFF else np.uint16 if largest <= 0xFFFF else np.uint32
+    return np.concatenate(bins), np.asarray(bin_offsets, dtype=np.int64), threshold_bin.astype(dtype)
+
+
 class RFCommandModel:
-    def __init__(self, model_dir: str | Path = "trained_models"):
+    def __init__(self, model_dir: str | Path = "trained_models", cache_size: int = 4096):
         model_dir = Path(model_dir)
-        self.models = {name: joblib.load(model_dir / f"rf_{name}.joblib") for name in EQUIPMENT}
+        combined = model_dir / COMBINED_MODEL_NAME
+
+        if combined.exists():
+            # One predict() per tick instead of seven
+            self.model = _prepare(joblib.load(combined), COMBINED_MODEL_NAME)
+            self.models = None
+        else:
+            # Older per-equipment models (rf_<name>.joblib)
+            self.model = None
+            self.models = {
+                name: _prepare(joblib.load(model_dir / f"rf_{name}.joblib"), f"rf_{name}")
+                for name in EQUIPMENT
+            }
+
+        # Reused input row (FEATURES order; trees compare in float32 anyway)
+        self._row = np.empty((1, len(FEATURES)), dtype=np.float32)
+
+        # With numba, walk the trees in a compiled loop instead of sklearn's predict()
+        self._forest = None
+        if HAS_NUMBA:
+            if self.model is not None:
+                self._forest = _flatten_forests([(self.model, 0)])
+            else:
+                self._forest = _flatten_forests([(self.models[name], j) for j, name in enumerate(EQUIPMENT)])
+
+        # LRU of decisions keyed on the exact float32 input row: the runner re-uses one
+        # prediction for 10 ticks, so steady state repeats the same features
+        # (cache_size=0 disables it)
+        self.cache_size = cache_size
+        self._cache: OrderedDict[bytes, dict] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def warmup(self):
+        """Compile (or load from the numba cache) the forest kernel before the first real tick"""
+        self.decide({k: 0 for k in FEATURES})
+
+    def cache_info(self) -> dict:
+        total = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "size": len(self._cache),
+            "hit_rate": self.cache_hits / total if total else 0.0,
+        }
 
     def decide(self, features: dict) -> dict:
-        # Build a DataFrame with correct column names and order
-        row = {k: features[k] for k in FEATURES}
-        X = pd.DataFrame([row], columns=FEATURES)
+        row = self._row[0]
+        for i, k in enumerate(FEATURES):
+            row[i] = features[k]
+
+        if not self.cache_size:
+            return self._predict_row(row)
+
+        key = row.tobytes()
+        hit = self._cache.get(key)
+        if hit is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return dict(hit)
+
+        self.cache_misses += 1
+        out = self._predict_row(row)
+        self._cache[key] = out
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return dict(out)
+
+    def _predict_row(self, row: np.ndarray) -> dict:
+        if self._forest is not None:
+            arrays, labels = self._forest
+            margins = forest_margin_binned(row, *arrays)
+            return {name: hi if m > 0 else lo for name, m, (lo, hi) in zip(EQUIPMENT, margins, labels)}
+
+        if self.model is not None:
+            preds = self.model.predict(self._row)[0]
+            return {name: bool(p) for name, p in zip(EQUIPMENT, preds)}
 
         out = {}
         for name, clf in self.models.items():
-            out[name] = bool(clf.predict(X)[0])
-        return out
\ No newline at end of file
+            out[name] = bool(clf.predict(self._row)[0])
+        return out
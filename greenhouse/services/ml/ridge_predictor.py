@@ -1,24 +1,46 @@
 from __future__ import annotations
 
+import hashlib
 from pathlib import Path
 import numpy as np
 import joblib
 
 METRICS = ["temperature", "humidity", "soil_moisture", "light_intensity", "co2_concentration"]
 
+# Fused export of the joblib bundle (see export_fused), looked up next to it
+FUSED_NAME = "ridge_fused.npz"
+
 
 class RidgeNextTickPredictor:
     """
     Loads ridge_next_tick.joblib bundle:
       bundle["model"], bundle["x_scaler"], bundle["y_scaler"]
     Predicts next tick metrics from last 10 readings (shape: (10,5)).
+
+    When ridge_fused.npz (export_fused) sits next to the bundle and was exported
+    from it, only its arrays are read: no unpickling, no sklearn import. The
+    sklearn objects (model, x_scaler, y_scaler) are None in that case.
     """
 
     def __init__(self, model_path: str | Path = "trained_models/ridge_next_tick.joblib"):
+        model_path = Path(model_path)
+        fused_path = model_path if model_path.suffix == ".npz" else model_path.with_name(FUSED_NAME)
+        self.model = self.x_scaler = self.y_scaler = None
+
+        if fused_path.exists() and _fused_matches(fused_path, model_path):
+            with np.load(fused_path) as data:
+                self.W = np.ascontiguousarray(data["W"], dtype=np.float32)
+                self.b = np.ascontiguousarray(data["b"], dtype=np.float32)
+                self.window_scale = np.ascontiguousarray(data["window_scale"], dtype=np.float32)
+            return
+
         bundle = joblib.load(str(model_path))
         self.model = bundle["model"]
         self.x_scaler = bundle["x_scaler"]
         self.y_scaler = bundle["y_scaler"]
+        self.W, self.b = _fuse(self.model, self.x_scaler, self.y_scaler)
+        # Per-input spread (10,5) the model was trained on, for "has the window moved" checks
+        self.window_scale = _window_scale(self.x_scaler)
 
     def predict_next(self, last_10: np.ndarray) -> dict:
         """
@@ -29,9 +51,60 @@ class RidgeNextTickPredictor:
         if last_10.shape != (10, 5):
             raise ValueError(f"Expected last_10 shape (10,5), got {last_10.shape}")
 
-        X = last_10.reshape(1, -1)  # (1, 50)
-        X_s = self.x_scaler.transform(X)
-        y_pred_s = self.model.predict(X_s)  # (1,5)
-        y_pred = self.y_scaler.inverse_transform(y_pred_s)[0]
+        # == y_scaler.inverse_transform(model.predict(x_scaler.transform(X)))
+        y_pred = self.W @ last_10.ravel().astype(np.float32) + self.b
 
         return {k: float(v) for k, v in zip(METRICS, y_pred)}
+
+
+def _fuse(model, x_scaler, y_scaler) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fold both StandardScalers into the ridge coefficients: one (5,50) affine map
+    y = W @ x + b in raw units, instead of transform -> predict -> inverse_transform.
+    """
+    coef = np.atleast_2d(model.coef_)
+    x_mean = x_scaler.mean_ if x_scaler.mean_ is not None else 0.0
+    x_scale = x_scaler.scale_ if x_scaler.scale_ is not None else 1.0
+    y_mean = y_scaler.mean_ if y_scaler.mean_ is not None else 0.0
+    y_scale = y_scaler.scale_ if y_scaler.scale_ is not None else 1.0
+
+    W = (coef / x_scale) * np.reshape(y_scale, (-1, 1))
+    b = y_scale * (model.intercept_ - (coef * (x_mean / x_scale)).sum(axis=1)) + y_mean
+    return W.astype(np.float32), np.asarray(b, dtype=np.float32)
+
+
+def _window_scale(x_scaler) -> np.ndarray:
+    x_scale = x_scaler.scale_ if x_scaler.scale_ is not None else np.ones(50)
+    return np.reshape(x_scale, (10, 5)).astype(np.float32)
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _fused_matches(fused_path: Path, model_path: Path) -> bool:
+    """False when the joblib bundle changed (retrained) since the export"""
+    if model_path == fused_path or not model_path.exists():
+        return True
+    with np.load(fused_path) as data:
+        return str(data["source_sha256"]) == _sha256(model_path)
+
+
+def export_fused(model_path: str | Path, out_path: str | Path | None = None) -> Path:
+    """
+    Write the fused W, b (and window_scale) of a ridge_next_tick.joblib bundle to
+    an uncompressed .npz (default: ridge_fused.npz next to the bundle).
+    """
+    model_path = Path(model_path)
+    out_path = Path(out_path) if out_path is not None else model_path.with_name(FUSED_NAME)
+
+    bundle = joblib.load(str(model_path))
+    W, b = _fuse(bundle["model"], bundle["x_scaler"], bundle["y_scaler"])
+    np.savez(
+        out_path,
+        W=W,
+        b=b,
+        window_scale=_window_scale(bundle["x_scaler"]),
+        source_sha256=np.array(_sha256(model_path)),
+    )
+    return out_path
@@ -3,7 +3,16 @@ from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
 import joblib
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+try:
+    import pyarrow.dataset as pa_ds
+
+    HAS_PYARROW = True
+except ImportError:  # pyarrow not installed -> per-file pandas reads
+    HAS_PYARROW = False
 
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import (
@@ -35,51 +44,150 @@ FEATURES = [
 ]
 
 
+# Single multi-output forest (one 0/1 column per equipment, EQUIPMENT order)
+COMBINED_MODEL_NAME = "rf_commands.joblib"
+
+# Inference cost grows with n_trees x depth: the sweep picks the smallest forest whose
+# mean val F1 stays within F1_TOLERANCE of the large reference forest
+SWEEP_N_ESTIMATORS = [16, 32, 64, 128]
+SWEEP_MAX_DEPTH = [8, 10, 12, 16]
+F1_TOLERANCE = 0.005
+
+
 @dataclass
 class SplitData:
     X: pd.DataFrame
-    y: pd.Series
+    y: pd.DataFrame  # one 0/1 column per target
 
 
-def load_split(split_dir: Path, target: str) -> SplitData:
+def _to_01(col: pd.Series) -> pd.Series:
+    # Booleans/numbers cast directly; text ("True"/"false"/...) is mapped first
+    if not (is_bool_dtype(col) or is_numeric_dtype(col)):
+        col = col.astype(str).str.strip().str.lower().map({"true": 1, "false": 0, "1": 1, "0": 0})
+    return col.fillna(0).astype("int8")
+
+
+def load_split(split_dir: Path, targets: list[str] = EQUIPMENT) -> SplitData:
     files = sorted(split_dir.glob("*.csv"))
     if not files:
         raise FileNotFoundError(f"No CSVs found in {split_dir.resolve()}")
 
-    df = pd.concat([pd.read_csv(p) for p in files], ignore_index=True)
-
-    missing = [c for c in FEATURES + [target] if c not in df.columns]
+    columns = FEATURES + targets
+    if HAS_PYARROW:
+        # One multi-threaded scan into a single table (no per-file frames + concat copy);
+        # True/False columns come back as bool already
+        dataset = pa_ds.dataset([str(p) for p in files], format="csv")
+        available = dataset.schema.names
+    else:
+        df = pd.concat([pd.read_csv(p) for p in files], ignore_index=True)
+        available = df.columns
+
+    missing = [c for c in columns if c not in available]
     if missing:
         raise ValueError(f"Missing columns in {split_dir}: {missing}")
 
-    X = df[FEATURES].copy()
+    if HAS_PYARROW:
+        df = dataset.to_table(columns=columns).to_pandas()
 
-    # Ensure booleans become 0/1
-    y = df[target]
-    if y.dtype == object:
-        y = y.astype(str).str.lower().map({"true": 1, "false": 0})
-    y = y.fillna(0).astype(int)
+    X = df[FEATURES].copy()
 
-    # Also convert prev_* to int if needed
+    # Ensure booleans become 0/1 (targets and prev_* features)
+    y = pd.DataFrame({c: _to_01(df[c]) for c in targets})
     for c in FEATURES:
-        if c.startswith("prev_") and X[c].dtype == object:
-            X[c] = X[c].astype(str).str.lower().map({"true": 1, "false": 0}).fillna(0).astype(int)
+        if c.startswith("prev_"):
+            X[c] = _to_01(X[c])
 
     return SplitData(X=X, y=y)
 
 
-def make_model() -> RandomForestClassifier:
-    # Strong baseline, not too huge
+def make_model(n_estimators: int = 64, max_depth: int | None = 12, min_samples_leaf: int = 8) -> RandomForestClassifier:
+    # Small enough for per-tick inference; make_model(400, None, 2) is the old large reference
     return RandomForestClassifier(
-        n_estimators=400,
-        max_depth=None,
-        min_samples_leaf=2,
+        n_estimators=n_estimators,
+        max_depth=max_depth,
+        min_samples_leaf=min_samples_leaf,
         class_weight="balanced_subsample",
         random_state=42,
         n_jobs=-1,
     )
 
 
+def mean_f1(y_true: pd.DataFrame, y_pred: np.ndarray) -> float:
+    """F1 averaged over the equipment columns"""
+    y_true = y_true.to_numpy()
+    return float(np.mean([
+        precision_recall_fscore_support(y_true[:, j], y_pred[:, j], average="binary", zero_division=0)[2]
+        for j in range(y_true.shape[1])
+    ]))
+
+
+def reference_f1(train: SplitData, val: SplitData) -> float:
+    """Mean val F1 of the large reference forest (400 trees, full depth)"""
+    reference = make_model(n_estimators=400, max_depth=None, min_samples_leaf=2)
+    reference.fit(train.X, train.y)
+    f1 = mean_f1(val.y, reference.predict(val.X))
+    print(f"reference (400 trees, full depth): val mean F1={f1:.4f}")
+    return f1
+
+
+def sweep_sizes(train: SplitData, val: SplitData, min_f1: float) -> RandomForestClassifier:
+    """Cheapest (n_estimators x max_depth) forest from the sweep grid with mean val F1 >= min_f1"""
+    grid = sorted(
+        ((n, d) for n in SWEEP_N_ESTIMATORS for d in SWEEP_MAX_DEPTH),
+        key=lambda nd: (nd[0] * nd[1], nd),
+    )
+    model = None
+    for n_estimators, max_depth in grid:
+        model = make_model(n_estimators=n_estimators, max_depth=max_depth)
+        model.fit(train.X, train.y)
+        f1 = mean_f1(val.y, model.predict(val.X))
+        print(f"  {n_estimators:4d} trees, depth {max_depth:2d}: val mean F1={f1:.4f}")
+        if f1 >= min_f1:
+            break
+    # Nothing within tolerance -> the largest grid entry
+    return model
+
+
+def _positive_proba(model: RandomForestClassifier, X: pd.DataFrame) -> np.ndarray:
+    """(n_trees, n_samples, n_outputs) float32 probability of class 1 per tree"""
+    X = X.to_numpy(dtype=np.float32)  # the trees were fit on float32 arrays
+    classes = model.classes_ if model.n_outputs_ > 1 else [model.classes_]
+    out = np.zeros((len(model.estimators_), X.shape[0], model.n_outputs_), dtype=np.float32)
+    for t, tree in enumerate(model.estimators_):
+        proba = tree.predict_proba(X)
+        if model.n_outputs_ == 1:
+            proba = [proba]
+        for j, (p, c) in enumerate(zip(proba, classes)):
+            if 1 in c:
+                out[t, :, j] = p[:, list(c).index(1)]
+    return out
+
+
+def prune_trees(model: RandomForestClassifier, val: SplitData, min_f1: float) -> RandomForestClassifier:
+    """
+    Drop the trees that add nothing on the val set: rank trees by their own mean F1,
+    keep the shortest best-first prefix whose ensemble F1 is >= min_f1 (or the full
+    forest's F1 if that is lower). Works in place (estimators_/n_estimators).
+    """
+    p1 = _positive_proba(model, val.X)
+    min_f1 = min(min_f1, mean_f1(val.y, (p1.mean(axis=0) > 0.5).astype(np.int8)))
+
+    order = np.argsort([-mean_f1(val.y, (p > 0.5).astype(np.int8)) for p in p1], kind="stable")
+    running = np.zeros(p1.shape[1:], dtype=np.float32)
+    keep = len(order)
+    for k, t in enumerate(order, start=1):
+        running += p1[t]
+        if mean_f1(val.y, (running / k > 0.5).astype(np.int8)) >= min_f1:
+            keep = k
+            break
+
+    kept = sorted(order[:keep])
+    print(f"pruned {len(model.estimators_) - keep} of {len(model.estimators_)} trees")
+    model.estimators_ = [model.estimators_[t] for t in kept]
+    model.n_estimators = len(model.estimators_)
+    return model
+
+
 def summarize(y_true, y_pred) -> dict:
     acc = accuracy_score(y_true, y_pred)
     bacc = balanced_accuracy_score(y_true, y_pred)
@@ -111,26 +219,30 @@ def fmt_metrics(m: dict) -> str:
     )
 
 
-def train_and_eval_one(target: str):
-    train = load_split(TRAIN_DIR, target)
-    val = load_split(VAL_DIR, target)
-    test = load_split(TEST_DIR, target)
+def train_and_eval_all():
+    """Fit one forest on all equipment targets at once (native multi-output) and save it."""
+    train = load_split(TRAIN_DIR)
+    val = load_split(VAL_DIR)
+    test = load_split(TEST_DIR)
 
-    model = make_model()
-    model.fit(train.X, train.y)
+    # Smallest swept forest, then pruned, both held to the reference F1 minus F1_TOLERANCE
+    min_f1 = reference_f1(train, val) - F1_TOLERANCE
+    model = prune_trees(sweep_sizes(train, val, min_f1), val, min_f1)
 
+    # (n_samples, len(EQUIPMENT)) predictions, columns in EQUIPMENT order
     val_pred = model.predict(val.X)
     test_pred = model.predict(test.X)
 
-    val_m = summarize(val.y, val_pred)
-    test_m = summarize(test.y, test_pred)
+    for j, target in enumerate(EQUIPMENT):
+        val_m = summarize(val.y[target], val_pred[:, j])
+        test_m = summarize(test.y[target], test_pred[:, j])
 
-    print(f"\n=== {target} ===")
-    print("VAL : " + fmt_metrics(val_m))
-    print("TEST: " + fmt_metrics(test_m))
+        print(f"\n=== {target} ===")
+        print("VAL : " + fmt_metrics(val_m))
+        print("TEST: " + fmt_metrics(test_m))
 
-    out_path = MODEL_DIR / f"rf_{target}.joblib"
-    joblib.dump(model, out_path)
+    out_path = MODEL_DIR / COMBINED_MODEL_NAME
+    joblib.dump(model, out_path, compress=3)
     print(f"Saved model -> {out_path}")
 
 
@@ -141,8 +253,7 @@ def main():
     print(f"  TEST ={TEST_DIR.resolve()}")
     print(f"  MODELS={MODEL_DIR.resolve()}")
 
-    for target in EQUIPMENT:
-        train_and_eval_one(target)
+    train_and_eval_all()
 
 
 if __name__ == "__main__":
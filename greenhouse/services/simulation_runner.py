@@ -2,12 +2,13 @@ from __future__ import annotations
 
 import time
 import threading
-from collections import deque
 
 import numpy as np
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 
-from greenhouse.models import EquipmentState, GreenhouseCommand, GreenhouseReading
+from greenhouse.models import EquipmentStateBits, GreenhouseCommand, GreenhouseReading, pack_equipment, unpack_equipment
 from greenhouse.services.data_generator import GreenhouseDataGenerator
 from greenhouse.services.ml.ridge_predictor import RidgeNextTickPredictor
 from greenhouse.services.ml.rf_command_model import RFCommandModel, EQUIPMENT
@@ -15,16 +16,57 @@ from greenhouse.services.ml.rf_command_model import RFCommandModel, EQUIPMENT
 METRICS = ["temperature", "humidity", "soil_moisture", "light_intensity", "co2_concentration"]
 
 
+# Process-local copy of EquipmentStateBits, written through by apply_equipment_state()
+# (disable with settings.GREENHOUSE_EQUIPMENT_CACHE = False for multi-writer setups)
+_EQUIP_CACHE: dict | None = None
+_EQUIP_LOCK = threading.Lock()
+
+
+def _equipment_cache_enabled() -> bool:
+    return getattr(settings, "GREENHOUSE_EQUIPMENT_CACHE", True)
+
+
+def _set_equipment_cache(state: dict | None):
+    global _EQUIP_CACHE
+    with _EQUIP_LOCK:
+        _EQUIP_CACHE = state
+
+
+def invalidate_equipment_state_cache():
+    """Forget the cached state (after EquipmentStateBits was written outside apply_equipment_state)"""
+    _set_equipment_cache(None)
+
+
 def get_equipment_state_dict() -> dict:
-    return {e.equipment_type: bool(e.is_active) for e in EquipmentState.objects.all()}
+    global _EQUIP_CACHE
+    if not _equipment_cache_enabled():
+        return unpack_equipment(EquipmentStateBits.current_bits())
+
+    with _EQUIP_LOCK:
+        if _EQUIP_CACHE is None:
+            _EQUIP_CACHE = unpack_equipment(EquipmentStateBits.current_bits())
+        return dict(_EQUIP_CACHE)
+
+
+def ensure_equipment_row():
+    """Create the EquipmentStateBits row (all off) if missing, so updates never need to insert"""
+    EquipmentStateBits.objects.get_or_create(pk=EquipmentStateBits.SINGLETON_ID)
 
 
 def apply_equipment_state(new_state: dict):
-    for eq in EQUIPMENT:
-        EquipmentState.objects.update_or_create(
-            equipment_type=eq,
-            defaults={"is_active": bool(new_state.get(eq, False))}
-        )
+    # A single one-row UPDATE (the row exists, see ensure_equipment_row)
+    bits = pack_equipment(new_state)
+    updated = EquipmentStateBits.objects.filter(pk=EquipmentStateBits.SINGLETON_ID).update(
+        bits=bits, updated_at=timezone.now()  # update() skips auto_now
+    )
+    if not updated:
+        # Row deleted behind our back
+        EquipmentStateBits.objects.create(pk=EquipmentStateBits.SINGLETON_ID, bits=bits)
+
+    # Only cache what was actually committed (the tick writes run inside a transaction)
+    if _equipment_cache_enabled():
+        state = unpack_equipment(bits)
+        transaction.on_commit(lambda: _set_equipment_cache(state))
 
 def log_tick(tick, reading, prediction, command):
     print("\n" + "=" * 100)
@@ -79,8 +121,17 @@ class SimulationRunner:
         self.predictor = RidgeNextTickPredictor("trained_models/ridge_next_tick.joblib")
         self.controller = RFCommandModel("trained_models")
 
-        # store last 10 readings (T,H,S,L,CO2)
-        self.last10 = deque(maxlen=10)
+        # last 10 readings (T,H,S,L,CO2) as a ring buffer; every row is written twice
+        # (slot i and i+10) so the window in chronological order is always the
+        # contiguous slice [head, head+10) -- no copy/roll before predicting
+        self._last10 = np.zeros((20, 5), dtype=np.float32)
+        self._head = 0
+        self._filled = 0
+
+        # Last ridge prediction and the window it was computed from
+        self.predict_tolerance = float(getattr(settings, "GREENHOUSE_PREDICT_TOLERANCE", 0.0))
+        self._cached_pred: dict | None = None
+        self._pred_window: np.ndarray | None = None
 
     def start(self, config_name: str = "optimal", interval: float = 1.0, clear_data: bool = False):
         if self.is_running:
@@ -89,16 +140,24 @@ class SimulationRunner:
         self.config_name = config_name
         self.interval = float(interval)
         self.tick = 0
-        self.last10.clear()
+        self._head = 0
+        self._filled = 0
+        self._cached_pred = None
+        self._pred_window = None
         self._stop_event.clear()
 
-        self.generator = GreenhouseDataGenerator(config_name=config_name)
+        self.generator = GreenhouseDataGenerator(config_name=config_name, verbose=True)
         self.generator.initialize(clear_data=clear_data)
-
-        # Prime the deque from DB with the most recent reading if available
-        latest = GreenhouseReading.objects.order_by("-id").first()
+        ensure_equipment_row()
+        # initialize() rewrote EquipmentStateBits with the starting config
+        invalidate_equipment_state_cache()
+        # Pay the forest kernel's JIT compile here, not on the first live tick
+        self.controller.warmup()
+
+        # Prime the window from DB with the most recent reading if available (metric columns only)
+        latest = GreenhouseReading.objects.order_by("-id").values_list(*METRICS).first()
         if latest:
-            self.last10.append([latest.temperature, latest.humidity, latest.soil_moisture, latest.light_intensity, latest.co2_concentration])
+            self._push_row(latest)
 
         self._thread = threading.Thread(target=self._run_loop, daemon=True)
         self.is_running = True
@@ -110,6 +169,8 @@ class SimulationRunner:
         self._stop_event.set()
         if self._thread:
             self._thread.join(timeout=5)
+        if self.generator is not None:
+            self.generator.flush()
         self.is_running = False
 
     def status(self) -> dict:
@@ -118,11 +179,36 @@ class SimulationRunner:
             "tick": self.tick,
             "config": self.config_name,
             "interval": self.interval,
-            "last10_len": len(self.last10),
+            "last10_len": self._filled,
         }
 
+    def _push_reading(self, reading):
+        self._push_row((reading.temperature, reading.humidity, reading.soil_moisture, reading.light_intensity, reading.co2_concentration))
+
+    def _push_row(self, row):
+        """Append one (METRICS order) row to the double-written window"""
+        self._last10[self._head] = row
+        self._last10[self._head + 10] = row
+        self._head = (self._head + 1) % 10
+        self._filled = min(10, self._filled + 1)
+
+    def _last10_window(self) -> np.ndarray:
+        """(10,5) view of the last 10 readings, oldest first"""
+        return self._last10[self._head:self._head + 10]
+
+    def _window_moved(self, window: np.ndarray) -> bool:
+        # Compared against the window of the cached prediction (not the last skipped one),
+        # so slow drift still triggers a new prediction
+        if self.predict_tolerance <= 0 or self._pred_window is None:
+            return True
+        drift = np.abs(window - self._pred_window) / self.predictor.window_scale
+        return bool(drift.max() >= self.predict_tolerance)
+
     def _run_loop(self):
+        # Ticks are scheduled on a fixed monotonic grid, so the work time doesn't add up as drift
+        deadline = time.monotonic()
         while not self._stop_event.is_set():
+            deadline += self.interval
             try:
                 self._one_tick()
             except Exception as e:
@@ -130,20 +216,28 @@ class SimulationRunner:
                 print(f"[SimulationRunner] ERROR at tick {self.tick}: {e}")
 
             if self.interval > 0:
-                time.sleep(self.interval)
+                slack = deadline - time.monotonic()
+                if slack > 0:
+                    # wait() instead of sleep() so stop() doesn't have to wait out the interval
+                    self._stop_event.wait(slack)
+                else:
+                    # Overrun: skip the missed ticks instead of bursting to catch up
+                    print(f"[SimulationRunner] tick {self.tick} overran the {self.interval:.3f}s interval by {-slack:.3f}s")
+                    deadline = time.monotonic()
 
         self.is_running = False
 
-    @transaction.atomic
     def _one_tick(self):
         assert self.generator is not None
 
-        # 1) Generate + save a new reading (your generator already saves it)
+        # Only step 3 runs in a transaction: generation and inference (milliseconds of
+        # ML work) stay in autocommit so they don't hold the database write lock.
+
+        # 1) Generate + save a new reading (your generator already saves it, in autocommit)
         reading = self.generator.generate_reading()
         self.tick += 1
 
-        # Push to last10
-        self.last10.append([reading.temperature, reading.humidity, reading.soil_moisture, reading.light_intensity, reading.co2_concentration])
+        self._push_reading(reading)
 
         # 2) Decide command
         # If we don't have 10 readings yet, just keep current equipment state (warm-up)
@@ -152,12 +246,14 @@ class SimulationRunner:
 
         prediction_for_log = None
 
-        if len(self.last10) < 10:
+        if self._filled < 10:
             cmd_dict = equipment_now  # warm-up
         else:
-            if self.tick % 10 == 0 or not hasattr(self, "_cached_pred"):
-                last_10_np = np.array(self.last10, dtype=float)  # (10,5)
-                self._cached_pred = self.predictor.predict_next(last_10_np)
+            if self.tick % 10 == 0 or self._cached_pred is None:
+                window = self._last10_window()
+                if self._cached_pred is None or self._window_moved(window):
+                    self._cached_pred = self.predictor.predict_next(window)
+                    self._pred_window = window.copy()
 
             pred = self._cached_pred
             prediction_for_log = pred
@@ -173,16 +269,11 @@ class SimulationRunner:
 
             cmd_dict = self.controller.decide(features)
 
-        # 3) Persist command + update EquipmentState
-        GreenhouseCommand.objects.create(
-            heater=bool(cmd_dict.get("heater", False)),
-            ventilation=bool(cmd_dict.get("ventilation", False)),
-            irrigation=bool(cmd_dict.get("irrigation", False)),
-            co2_injector=bool(cmd_dict.get("co2_injector", False)),
-            lights=bool(cmd_dict.get("lights", False)),
-            dehumidifier=bool(cmd_dict.get("dehumidifier", False)),
-            light_blinds=bool(cmd_dict.get("light_blinds", False)),
-        )
+        # 3) Persist command + update EquipmentStateBits (one INSERT + one UPDATE, committed together)
+        with transaction.atomic():
+            GreenhouseCommand.objects.create(**{eq: bool(cmd_dict.get(eq, False)) for eq in EQUIPMENT})
+            apply_equipment_state(cmd_dict)
 
-        apply_equipment_state(cmd_dict)
+        for eq in EQUIPMENT:
+            self.generator.set_equipment(eq, cmd_dict.get(eq, False))
         log_tick(self.tick, reading, prediction_for_log, cmd_dict)
\ No newline at end of file
@@ -0,0 +1,23 @@
+import weakref
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from greenhouse.models import EquipmentStateBits, unpack_equipment
+
+# Persisting GreenhouseDataGenerator instances whose equipment cache follows the DB
+live_generators = weakref.WeakSet()
+
+
+@receiver(post_save, sender=EquipmentStateBits)
+def equipment_state_saved(sender, instance, **kwargs):
+    """Push the saved equipment bits into every live generator's cache"""
+    states = unpack_equipment(instance.bits).values()
+    for generator in list(live_generators):
+        generator.set_equipment_vector(states)
+
+    # The runner's process-local copy must not outlive a write made outside
+    # apply_equipment_state (e.g. toggle_equipment); it re-reads once committed
+    from greenhouse.services.simulation_runner import invalidate_equipment_state_cache
+    transaction.on_commit(invalidate_equipment_state_cache)
@@ -1,3 +1,109 @@
-from django.test import TestCase
+import math
 
-# Create your tests here.
+import numpy as np
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from greenhouse.models import EQUIPMENT, EquipmentStateBits, GreenhouseReading, unpack_equipment
+from greenhouse.services.data_generator import GreenhouseDataGenerator
+from greenhouse.services.decision import GreenhouseDecisionModel, GreenhouseThresholds, _rule_boundaries
+
+METRICS = ["temperature", "humidity", "soil_moisture", "light_intensity", "co2_concentration"]
+
+
+class DecisionTableTests(SimpleTestCase):
+    """decide()/decide_bits() look commands up in a table built from decide_batch(); they must agree"""
+
+    def _inputs(self, config, n_random=20000, seed=0):
+        rng = np.random.default_rng(seed)
+        bounds = _rule_boundaries(config)
+
+        # Every bound and its neighbouring floats, one input at a time (others random)
+        on_bounds = []
+        for i, per_input in enumerate(bounds):
+            for b in per_input:
+                for x in (b, math.nextafter(b, -math.inf), math.nextafter(b, math.inf)):
+                    on_bounds.append((i, x))
+
+        lo = np.array([min(b) - 5.0 for b in bounds])
+        hi = np.array([max(b) + 5.0 for b in bounds])
+        values = rng.uniform(lo, hi, size=(n_random + len(on_bounds), 5))
+        for row, (i, x) in enumerate(on_bounds, start=n_random):
+            values[row, i] = x
+
+        # Inputs that sit on a bound for every metric at once
+        grid = np.array([[rng.choice(per_input) for per_input in bounds] for _ in range(2000)])
+        values = np.vstack([values, grid])
+
+        states = rng.integers(0, 1 << len(EQUIPMENT), size=len(values))
+        return values, states
+
+    def _check(self, config):
+        model = GreenhouseDecisionModel(config)
+        values, states = self._inputs(config)
+        state_matrix = (states[:, None] >> np.arange(len(EQUIPMENT))) & 1
+
+        expected = model.decide_batch(values, state_matrix)
+        weights = 1 << np.arange(len(EQUIPMENT))
+        expected_bits = (expected * weights).sum(axis=1)
+
+        for row, (x, state) in enumerate(zip(values, states)):
+            bits = model.decide_bits(x, int(state))
+            self.assertEqual(bits, expected_bits[row], msg=f"decide_bits({x.tolist()}, {state})")
+
+            if row % 10 == 0:
+                prediction = GreenhouseReading(**dict(zip(METRICS, x.tolist())))
+                command = model.decide(prediction, equipment_state=unpack_equipment(int(state)))
+                got = [getattr(command, name) for name in EQUIPMENT]
+                self.assertEqual(got, expected[row].tolist(), msg=f"decide({x.tolist()}, {state})")
+
+    def test_default_thresholds(self):
+        self._check(GreenhouseThresholds())
+
+    def test_custom_thresholds(self):
+        self._check(GreenhouseThresholds(TEMP_MIN=15.5, TEMP_MAX=24.25, HUM_MAX=70.0, CO2_MIN=450.0, SOIL_BUFFER=3.0))
+
+
+class DecisionEmptyDbTests(TestCase):
+    def test_decide_without_equipment_row(self):
+        """With no EquipmentStateBits row, decide() starts from all equipment off"""
+        EquipmentStateBits.objects.all().delete()  # migration 0006 creates the row
+        model = GreenhouseDecisionModel()
+        all_off = {name: False for name in EQUIPMENT}
+
+        for values in ((15.0, 90.0, 30.0, 1000.0, 300.0), (22.0, 65.0, 60.0, 20000.0, 600.0), (30.0, 40.0, 50.0, 60000.0, 500.0)):
+            prediction = GreenhouseReading(**dict(zip(METRICS, values)))
+            command = model.decide(prediction)
+            expected = model.decide(prediction, equipment_state=all_off)
+            self.assertEqual(
+                [getattr(command, name) for name in EQUIPMENT],
+                [getattr(expected, name) for name in EQUIPMENT],
+            )
+
+
+class GeneratorQueryTests(TestCase):
+    def test_no_equipment_queries_per_reading(self):
+        """A persisting generator reads its equipment from memory, not the DB, on every tick"""
+        generator = GreenhouseDataGenerator('optimal', seed=1)
+        generator.initialize(clear_data=True)
+        table = EquipmentStateBits._meta.db_table
+
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(20):
+                generator.generate_reading()
+
+        equipment_queries = [q['sql'] for q in ctx.captured_queries if table in q['sql']]
+        self.assertEqual(equipment_queries, [])
+        self.assertEqual(GreenhouseReading.objects.count(), 21)
+
+    def test_backfill_applies_eps(self):
+        """generate_many() stores only the rows the eps filter keeps, and tracks the last one"""
+        generator = GreenhouseDataGenerator('optimal', seed=1, eps=0.01)
+        generator.initialize(clear_data=True)
+
+        readings = generator.generate_many(500)
+
+        stored = list(GreenhouseReading.objects.order_by('tick').values_list('tick', flat=True))
+        self.assertLess(len(stored), len(readings))
+        self.assertEqual(generator._last_persisted_tick, stored[-1])
@@ -122,3 +122,13 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Greenhouse simulation
+# Keep the equipment state in a process-local cache in the SimulationRunner.
+# Turn off when another process also writes EquipmentStateBits.
+
+GREENHOUSE_EQUIPMENT_CACHE = True
+
+# Reuse the previous ridge prediction while no reading in the 10-tick window moved
+# by more than this many (training) standard deviations. 0 = always predict.
+GREENHOUSE_PREDICT_TOLERANCE = 0.0
@@ -1,7 +1,17 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
 import pandas as pd
+from pandas.api.types import is_bool_dtype, is_integer_dtype
+
+try:
+    import pyarrow  # noqa: F401 - only needed for read_csv(engine="pyarrow")
+
+    HAS_PYARROW = True
+except ImportError:  # pyarrow not installed -> default pandas parser
+    HAS_PYARROW = False
 
 EQUIPMENT_FIELDS = [
     "heater", "ventilation", "irrigation",
@@ -12,40 +22,68 @@ READING_FIELDS = [
     "temperature", "humidity", "soil_moisture", "light_intensity", "co2_concentration"
 ]
 
+# Spellings accepted for the equipment columns (parsed by the CSV reader itself)
+TRUE_VALUES = ["True", "true", "TRUE", "1"]
+FALSE_VALUES = ["False", "false", "FALSE", "0"]
+
+
+def _is_01(col: pd.Series) -> bool:
+    if is_bool_dtype(col):
+        return True
+    return is_integer_dtype(col) and bool(col.isin((0, 1)).all())
+
+
+def read_equipment_csv(path: Path) -> pd.DataFrame:
+    """Read a CSV with the equipment columns parsed straight to booleans by the reader"""
+    if HAS_PYARROW:
+        # Multi-threaded parser; only trusted when it inferred every equipment column as bool,
+        # or as integers that are all 0/1 (generate_training_data writes %d)
+        # (it knows True/true/TRUE but not " True" or empty cells)
+        df = pd.read_csv(path, engine="pyarrow")
+        if all(_is_01(df[c]) for c in EQUIPMENT_FIELDS if c in df.columns):
+            for c in EQUIPMENT_FIELDS:
+                if c in df.columns:
+                    df[c] = df[c].astype(bool)
+            return df
+
+    options = dict(true_values=TRUE_VALUES, false_values=FALSE_VALUES, skipinitialspace=True)
+    try:
+        return pd.read_csv(path, dtype={c: "bool" for c in EQUIPMENT_FIELDS}, **options)
+    except ValueError:
+        # Empty cells: retry with the (slower) nullable dtype, NA is filled below
+        return pd.read_csv(path, dtype={c: "boolean" for c in EQUIPMENT_FIELDS}, **options)
+
 
 def convert_file(in_path: Path, out_path: Path, drop_first: bool) -> None:
-    df = pd.read_csv(in_path)
+    df = read_equipment_csv(in_path)
 
     # Basic validation
     missing = [c for c in READING_FIELDS + EQUIPMENT_FIELDS if c not in df.columns]
     if missing:
         raise ValueError(f"{in_path.name}: missing columns: {missing}")
 
-    # Normalize boolean columns (handles "True"/"False" strings)
-    for c in EQUIPMENT_FIELDS:
-        if df[c].dtype == object:
-            df[c] = df[c].astype(str).str.strip().str.lower().map({"true": True, "false": False})
-        df[c] = df[c].fillna(False).astype(bool)
+    # Empty cells count as off
+    equipment = df[EQUIPMENT_FIELDS].fillna(False).astype(bool)
 
-    # Build prev_* columns by shifting the equipment columns
-    for c in EQUIPMENT_FIELDS:
-        df[f"prev_{c}"] = df[c].shift(1, fill_value=False).astype(bool)
+    # Build prev_* columns by shifting the whole equipment block once
+    prev = equipment.shift(1, fill_value=False).add_prefix("prev_")
+
+    # Columns in order: readings, prev_*, commands
+    df = pd.concat([df[READING_FIELDS], prev, equipment], axis=1)
 
     if drop_first:
         df = df.iloc[1:].reset_index(drop=True)
 
-    # Reorder columns nicely: readings, prev_*, commands
-    ordered_cols = (
-        READING_FIELDS
-        + [f"prev_{c}" for c in EQUIPMENT_FIELDS]
-        + EQUIPMENT_FIELDS
-    )
-    df = df[ordered_cols]
-
     out_path.parent.mkdir(parents=True, exist_ok=True)
     df.to_csv(out_path, index=False)
 
 
+def _convert(in_path: Path, out_dir: Path, suffix: str, drop_first: bool) -> Path:
+    out_path = out_dir / (in_path.stem + suffix + in_path.suffix)
+    convert_file(in_path, out_path, drop_first=drop_first)
+    return out_path
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Add prev_* equipment state columns to greenhouse CSV datasets."
@@ -66,6 +104,10 @@ def main():
         "--suffix", default="_with_prev",
         help="Suffix added to output filenames (before .csv)"
     )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Worker processes (files are converted in parallel; default: all cores)"
+    )
 
     args = parser.parse_args()
     in_dir = Path(args.input_dir)
@@ -75,12 +117,10 @@ def main():
     if not csv_files:
         raise SystemExit(f"No .csv files found in {in_dir}")
 
-    for in_path in csv_files:
-        out_name = in_path.stem + args.suffix + in_path.suffix
-        out_path = out_dir / out_name
-
-        convert_file(in_path, out_path, drop_first=args.drop_first)
-        print(f"Converted: {in_path.name} -> {out_path}")
+    convert = partial(_convert, out_dir=out_dir, suffix=args.suffix, drop_first=args.drop_first)
+    with ProcessPoolExecutor(max_workers=args.workers) as ex:
+        for in_path, out_path in zip(csv_files, ex.map(convert, csv_files)):
+            print(f"Converted: {in_path.name} -> {out_path}")
 
     print("Done.")
 
@@ -1,8 +1,17 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import pandas as pd
 
+try:
+    import pyarrow  # noqa: F401 - only needed for read_csv(engine="pyarrow")
+
+    HAS_PYARROW = True
+except ImportError:  # pyarrow not installed -> default pandas parser
+    HAS_PYARROW = False
+
+
 def split_one_df(df: pd.DataFrame, seed: int, train: float, val: float):
     # Shuffle rows deterministically
     df = df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
@@ -20,6 +29,17 @@ def split_one_df(df: pd.DataFrame, seed: int, train: float, val: float):
     return train_df, val_df, test_df
 
 
+def split_one_file(f: Path, file_seed: int, train: float, val: float, out_dirs: tuple[Path, Path, Path]):
+    df = pd.read_csv(f, engine="pyarrow" if HAS_PYARROW else "c")
+
+    tr, va, te = split_one_df(df, seed=file_seed, train=train, val=val)
+
+    for part, part_dir in zip((tr, va, te), out_dirs):
+        part.to_csv(part_dir / f.name, index=False)
+
+    return len(tr), len(va), len(te)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Balanced split: split each CSV into train/val/test, preserving equal config contribution."
@@ -31,6 +51,7 @@ def main():
     parser.add_argument("--val", type=float, default=0.15, help="Validation ratio.")
     parser.add_argument("--test", type=float, default=0.15, help="Test ratio.")
     parser.add_argument("--pattern", type=str, default="*.csv", help="Glob pattern for input CSVs.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores).")
     args = parser.parse_args()
 
     if abs((args.train + args.val + args.test) - 1.0) > 1e-9:
@@ -52,27 +73,24 @@ def main():
 
     total_counts = {"train": 0, "val": 0, "test": 0}
 
-    for f in files:
-        df = pd.read_csv(f)
-
-        # Optional: make per-file seed stable but different across files
-        file_seed = (hash(f.name) ^ args.seed) & 0xFFFFFFFF
-
-        tr, va, te = split_one_df(df, seed=file_seed, train=args.train, val=args.val)
-
-        tr_path = train_dir / f.name
-        va_path = val_dir / f.name
-        te_path = test_dir / f.name
+    # Optional: make per-file seed stable but different across files
+    # (computed here: workers may not share this process's str hash seed)
+    seeds = [(hash(f.name) ^ args.seed) & 0xFFFFFFFF for f in files]
+    out_dirs = (train_dir, val_dir, test_dir)
 
-        tr.to_csv(tr_path, index=False)
-        va.to_csv(va_path, index=False)
-        te.to_csv(te_path, index=False)
+    with ProcessPoolExecutor(max_workers=args.workers) as ex:
+        futures = [
+            ex.submit(split_one_file, f, file_seed, args.train, args.val, out_dirs)
+            for f, file_seed in zip(files, seeds)
+        ]
+        for f, fut in zip(files, futures):
+            n_tr, n_va, n_te = fut.result()
 
-        total_counts["train"] += len(tr)
-        total_counts["val"] += len(va)
-        total_counts["test"] += len(te)
+            total_counts["train"] += n_tr
+            total_counts["val"] += n_va
+            total_counts["test"] += n_te
 
-        print(f"{f.name}: train={len(tr)} val={len(va)} test={len(te)}")
+            print(f"{f.name}: train={n_tr} val={n_va} test={n_te}")
 
     print("\nTOTALS")
     print(f"train={total_counts['train']} val={total_counts['val']} test={total_counts['test']}")